@@ -0,0 +1,99 @@
+import os
+import sys
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import tensorflow as tf
+import numpy as np
+import cv2 as cv
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.engine import load_ground_truth
+from segmentation.serving import compile_model
+from segmentation.metrics import confusion_matrix
+from segmentation.postprocess import prediction_to_mask
+from segmentation.benchmark import StageTimer, summarize, peak_rss_mb, environment_info, save_results, load_results, compare_results
+from segmentation.registry import ModelRegistry
+
+#User selections
+models_to_benchmark = ['unet', 'deeplabv3p', 'fcn', 'fpn', 'linknet', 'pspnet']
+max_images = 30 #Maximum number of images per dataset (None: all)
+compare_with = None #Path of a previous results JSON to compare with (None: no comparison)
+
+#Initialization of variables
+path_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+path_models_dir = os.path.join(path_root, "models")
+registry = ModelRegistry(path_models_dir) #Input size, normalization, threshold and path of every model
+path_results_dir = os.path.join(path_root, "benchmarks", "results")
+path_synthetic = os.path.join(path_root, "synthetic_images")
+datasets = {"real_images": os.path.join(path_root, "real_images")}
+for category in sorted(os.listdir(path_synthetic)):
+    if os.path.isdir(os.path.join(path_synthetic, category, "images")):
+        datasets["synthetic_images/" + category] = os.path.join(path_synthetic, category)
+stages = ["decode", "resize", "normalize", "forward", "postprocess", "metric", "write"]
+
+
+def benchmark_dataset(model_name, predict_fn, path_dataset, output_dir):
+    IMAGE_SIZE = registry.image_size(model_name)
+    path_image_dir = os.path.join(path_dataset, "images")
+    path_masks_dir = os.path.join(path_dataset, "masks")
+    image_list = sorted(f for f in os.listdir(path_image_dir) if os.path.isfile(os.path.join(path_image_dir, f)))[:max_images]
+    timer = StageTimer()
+    totals = []
+    for image_name in image_list:
+        start_time = time.perf_counter()
+        with timer.stage("decode"):
+            ori_x = cv.imread(os.path.join(path_image_dir, image_name), cv.IMREAD_COLOR)
+        with timer.stage("resize"):
+            ori_x = cv.resize(ori_x, (IMAGE_SIZE, IMAGE_SIZE))
+        with timer.stage("normalize"):
+            x = np.expand_dims(registry.normalize(model_name, ori_x), axis=0)
+        with timer.stage("forward"):
+            pred = predict_fn(x)
+        with timer.stage("postprocess"):
+            pred_mask = prediction_to_mask(pred[0], registry.threshold(model_name))
+        with timer.stage("metric"):
+            path_mask = os.path.join(path_masks_dir, image_name)
+            if os.path.isfile(path_mask):
+                confusion_matrix(pred_mask, load_ground_truth(path_mask, IMAGE_SIZE))
+        with timer.stage("write"):
+            cv.imwrite(os.path.join(output_dir, os.path.splitext(image_name)[0] + ".png"), pred_mask)
+        totals.append(time.perf_counter() - start_time)
+    total_time = sum(totals)
+    return {'n_images': len(image_list), 'stages': timer.summary(), 'total': summarize(totals),
+            'images_per_sec': len(image_list)/total_time if total_time > 0 else None}
+
+
+results = {'environment': environment_info(), 'config': {'max_images': max_images, 'models': models_to_benchmark},
+           'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'results': {}}
+with tempfile.TemporaryDirectory() as output_dir:
+    for model_name in models_to_benchmark:
+        IMAGE_SIZE = registry.image_size(model_name)
+        start_time = time.perf_counter()
+        model = tf.keras.models.load_model(registry.path(model_name), compile=False)
+        load_time = time.perf_counter() - start_time
+        predict_fn = compile_model(model, IMAGE_SIZE)
+        results['results'][model_name] = {}
+        for dataset, path_dataset in datasets.items():
+            result = benchmark_dataset(model_name, predict_fn, path_dataset, output_dir)
+            result['load_s'] = load_time
+            result['warmup_s'] = predict_fn.warmup_time
+            result['peak_rss_mb'] = peak_rss_mb()
+            results['results'][model_name][dataset] = result
+            print(model_name + " - " + dataset + ": " + str(result['images_per_sec']) + " images/s, p50 " + str(result['total'].get('p50_ms')) + " ms, p95 " + str(result['total'].get('p95_ms')) + " ms, p99 " + str(result['total'].get('p99_ms')) + " ms")
+            for stage in stages:
+                stats = result['stages'].get(stage, {})
+                print("\t- " + stage + ": p50 " + str(stats.get('p50_ms')) + " ms, p95 " + str(stats.get('p95_ms')) + " ms, p99 " + str(stats.get('p99_ms')) + " ms")
+
+#Save results
+if not os.path.exists(path_results_dir):
+    os.makedirs(path_results_dir)
+path_results = os.path.join(path_results_dir, "pipeline_" + time.strftime("%Y%m%d_%H%M%S") + ".json")
+save_results(results, path_results)
+print("Peak RSS: " + str(peak_rss_mb()) + " MB")
+print("Results saved in: " + path_results)
+
+#Compare with previous results
+if compare_with is not None:
+    ratios = compare_results(load_results(compare_with), results)
+    for (model_name, dataset, stage), ratio in sorted(ratios.items()):
+        print(model_name + " - " + dataset + " - " + stage + ": x" + str(ratio) + " p50 time vs " + compare_with)
@@ -0,0 +1,56 @@
+import os
+import sys
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import tensorflow as tf
+import numpy as np
+import cv2 as cv
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.postprocess import prediction_to_mask
+
+#User selection
+IMAGE_SIZE = 512
+n_images = 100
+repetitions = 5
+
+
+def postprocess_pil(pred):
+    """
+    Previous post-processing chain: PIL round-trip, RGB->BGR conversion and conversion back to a binary grayscale mask
+    """
+    pred_mask = pred > 0.5
+    prediction_image = tf.keras.preprocessing.image.array_to_img(pred_mask)
+    prediction_image2 = tf.keras.preprocessing.image.img_to_array(prediction_image)
+    pred_image_cv2 = cv.cvtColor(prediction_image2.astype('uint8'), cv.COLOR_RGB2BGR)
+    image_gray_segmented = cv.cvtColor(pred_image_cv2, cv.COLOR_BGR2GRAY)
+    return image_gray_segmented > 0
+
+
+def postprocess_direct(pred):
+    return prediction_to_mask(pred) > 0
+
+
+def time_per_image(postprocess_fn, preds):
+    best = None
+    for _ in range(repetitions):
+        start_time = time.perf_counter()
+        for pred in preds:
+            postprocess_fn(pred)
+        elapsed = (time.perf_counter() - start_time)/len(preds)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+#Random sigmoid outputs with cable-like sparsity
+rng = np.random.default_rng(0)
+preds = rng.beta(0.3, 1.5, size=(n_images, IMAGE_SIZE, IMAGE_SIZE, 1)).astype(np.float32)
+
+for pred in preds[:10]:
+    if not np.array_equal(postprocess_pil(pred), postprocess_direct(pred)):
+        raise AssertionError("The direct post-processing does not match the PIL chain")
+
+time_pil = time_per_image(postprocess_pil, preds)
+time_direct = time_per_image(postprocess_direct, preds)
+print("PIL chain: " + str(time_pil*1000) + " ms/image")
+print("Direct: " + str(time_direct*1000) + " ms/image")
+print("Saving: " + str((time_pil - time_direct)*1000) + " ms/image (x" + str(time_pil/time_direct) + ")")
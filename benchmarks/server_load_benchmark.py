@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+import time
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.benchmark import summarize
+
+#User selections
+server_url = "http://localhost:8080"
+model_name = 'unet'
+images_folder = "real_images"
+concurrency = 16 #Number of concurrent clients
+n_requests = 400
+
+#Initialization of variables
+path_image_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), images_folder, "images")
+image_list = sorted(f for f in os.listdir(path_image_dir) if os.path.isfile(os.path.join(path_image_dir, f)))
+images = []
+for image_name in image_list:
+    with open(os.path.join(path_image_dir, image_name), "rb") as f:
+        images.append(f.read())
+
+
+def send_request(i):
+    request = urllib.request.Request(server_url + "/segment/" + model_name, data=images[i % len(images)], method="POST")
+    start_time = time.time()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            return time.time() - start_time, float(response.headers["X-Queue-Time"]), response.status
+    except urllib.error.HTTPError as e:
+        return time.time() - start_time, None, e.code
+
+
+start_time = time.time()
+with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    results = list(pool.map(send_request, range(n_requests)))
+total_time = time.time() - start_time
+
+latencies = [latency for latency, _, status in results if status == 200]
+queue_times = [queue_time for _, queue_time, status in results if status == 200]
+print("Requests: " + str(n_requests) + " - Concurrency: " + str(concurrency))
+print("Succeeded: " + str(len(latencies)) + " - Rejected (503): " + str(sum(1 for _, _, status in results if status == 503)))
+print("Throughput: " + str(len(latencies)/total_time) + " requests/s")
+print("Latency: " + json.dumps(summarize(latencies)))
+print("Queue latency: " + json.dumps(summarize(queue_times)))
+with urllib.request.urlopen(server_url + "/metrics") as response:
+    print("Server metrics: " + json.dumps(json.loads(response.read())[model_name], indent=2))
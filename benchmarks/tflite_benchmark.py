@@ -0,0 +1,65 @@
+import os
+import sys
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import tensorflow as tf
+import numpy as np
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.engine import read_resized, load_ground_truth
+from segmentation.serving import compile_model
+from segmentation.tflite_backend import load_tflite
+from segmentation.metrics import segmentation_metrics
+from segmentation.postprocess import prediction_to_mask
+from segmentation.registry import ModelRegistry
+
+#User selections
+images_folder = "real_images"
+quantization = "float16" #TFLite models exported with export_tflite.py
+models_to_compare = ['unet', 'deeplabv3p', 'fcn', 'fpn', 'linknet', 'pspnet']
+batch_size = 1
+num_threads = None #TFLite interpreter threads (None: default)
+
+#Initialization of variables
+path_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + "\\"
+path_dir = path_root + images_folder + "\\"
+path_models_dir = path_root + "models\\"
+registry = ModelRegistry(path_models_dir) #Input size, normalization, threshold and path of every model
+image_list = [f for f in os.listdir(path_dir + "images\\") if os.path.isfile(os.path.join(path_dir + "images\\", f))]
+
+
+def evaluate(predict_fn, images, gt_masks, threshold):
+    pred_masks = np.zeros(gt_masks.shape, dtype=np.uint8)
+    start_time = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        pred_masks[start:start+batch_size] = prediction_to_mask(predict_fn(images[start:start+batch_size]), threshold)
+    time_per_image = (time.perf_counter() - start_time)/len(images)
+    return pred_masks, segmentation_metrics(pred_masks, gt_masks), time_per_image
+
+
+results = {}
+for model_name in models_to_compare:
+    IMAGE_SIZE = registry.image_size(model_name)
+    threshold = registry.threshold(model_name)
+    images = np.stack([registry.normalize(model_name, read_resized(path_dir + "images\\" + image_name, IMAGE_SIZE)) for image_name in image_list])
+    gt_masks = np.stack([load_ground_truth(path_dir + "masks\\" + image_name, IMAGE_SIZE) for image_name in image_list])
+
+    model = tf.keras.models.load_model(registry.path(model_name), compile=False)
+    float_masks, float_metrics, float_time = evaluate(compile_model(model, IMAGE_SIZE, batch_size), images, gt_masks, threshold)
+    tflite_model = load_tflite(registry.tflite_path(model_name, quantization), IMAGE_SIZE, num_threads, batch_size)
+    tflite_masks, tflite_metrics, tflite_time = evaluate(tflite_model, images, gt_masks, threshold)
+    agreement = segmentation_metrics(tflite_masks, float_masks)
+
+    results[model_name] = {'IoU float': float(np.mean(float_metrics['IoU'])), 'IoU tflite': float(np.mean(tflite_metrics['IoU'])),
+                           'Dice float': float(np.mean(float_metrics['Dice'])), 'Dice tflite': float(np.mean(tflite_metrics['Dice'])),
+                           'IoU drift': float(np.mean(tflite_metrics['IoU']) - np.mean(float_metrics['IoU'])),
+                           'Dice drift': float(np.mean(tflite_metrics['Dice']) - np.mean(float_metrics['Dice'])),
+                           'IoU vs float': float(np.mean(agreement['IoU'])),
+                           'ms/image float': float_time*1000, 'ms/image tflite': tflite_time*1000,
+                           'Speedup': float_time/tflite_time}
+
+#Print results summary
+for model_name in results:
+    print(model_name + " (" + quantization + "):")
+    for metric_i in results[model_name]:
+        print('\t- ' + metric_i + ': ' + str(results[model_name][metric_i]))
+    print("---------------------------")
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+#Launches several headless Blender processes that generate the synthetic dataset in parallel.
+#Every worker generates every category with indices worker, worker+workers, ... Existing samples are skipped,
+#so running it again resumes an interrupted generation. Example:
+#python generate_parallel.py --blend scene.blend --workers 4
+
+
+def worker_command(args, worker):
+    script = os.path.join(os.path.dirname(os.path.realpath(__file__)), "synthetic_cables_generation.py")
+    command = [args.blender, "-b", args.blend, "-t", str(args.threads), "--python", script, "--",
+               "--worker", str(worker), "--workers", str(args.workers), "--seed", str(args.seed)]
+    if args.categories:
+        command += ["--categories", args.categories]
+    if args.two_pass_mask:
+        command += ["--two-pass-mask"]
+    if args.asset_cache_mb is not None:
+        command += ["--asset-cache-mb", str(args.asset_cache_mb)]
+    command += ["--format", args.format, "--samples-per-shard", str(args.samples_per_shard)]
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel headless generation of the synthetic cables dataset")
+    parser.add_argument("--blend", required=True, help="Blender scene file")
+    parser.add_argument("--blender", default="blender", help="Blender executable")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2)//2), help="Number of Blender processes")
+    parser.add_argument("--threads", type=int, default=2, help="Render threads per Blender process (0: all)")
+    parser.add_argument("--categories", default=None, help="Comma separated image categories (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed")
+    parser.add_argument("--two-pass-mask", action="store_true", help="Render the masks in a second render (to compare the render time)")
+    parser.add_argument("--asset-cache-mb", type=int, default=None, help="Memory budget of the HDRIs and textures of each worker")
+    parser.add_argument("--format", default="png", choices=["png", "shards"], help="Output: PNG files or tar shards with a metadata index")
+    parser.add_argument("--samples-per-shard", type=int, default=500, help="Samples per shard")
+    parser.add_argument("--retries", type=int, default=2, help="Times a crashed worker is restarted")
+    parser.add_argument("--logs", default="generation_logs", help="Folder for the worker logs")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.logs):
+        os.makedirs(args.logs)
+    start_time = time.time()
+    processes = {}
+    attempts = {}
+    for worker in range(args.workers):
+        attempts[worker] = 0
+        processes[worker] = start_worker(args, worker)
+
+    failed = []
+    while processes:
+        time.sleep(1)
+        for worker, (process, log) in list(processes.items()):
+            if process.poll() is None:
+                continue
+            log.close()
+            del processes[worker]
+            if process.returncode != 0:
+                if attempts[worker] < args.retries:
+                    attempts[worker] += 1
+                    print("Worker " + str(worker) + " exited with code " + str(process.returncode) + ", restarting (attempt " + str(attempts[worker]) + ")")
+                    processes[worker] = start_worker(args, worker)
+                else:
+                    failed.append(worker)
+            else:
+                print("Worker " + str(worker) + " finished")
+
+    print("Total time: " + str(time.time() - start_time) + "s")
+    if failed:
+        print("Failed workers: " + ", ".join(str(worker) for worker in failed) + ". Run again to resume them.")
+        sys.exit(1)
+
+
+def start_worker(args, worker):
+    log = open(os.path.join(args.logs, "worker_" + str(worker) + ".log"), "a")
+    process = subprocess.Popen(worker_command(args, worker), stdout=log, stderr=subprocess.STDOUT)
+    return process, log
+
+
+if __name__ == "__main__":
+    main()
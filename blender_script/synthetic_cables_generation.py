@@ -5,13 +5,79 @@ import time
 import re
 import math
 import os
+import sys
+import zlib
+import argparse
+from collections import OrderedDict
 import cv2
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from segmentation.shards import ShardWriter
+
+
+class AssetCache:
+    """
+    Loads every image (HDRIs and textures) once and reuses the datablock in the next samples.
+    When the estimated memory of the loaded images exceeds max_mb, the least recently used images that are not
+    assigned to any material or world are removed from the blend data.
+    """
+
+    def __init__(self, max_mb=4096):
+        self.max_bytes = max_mb*1024*1024
+        self.images = OrderedDict() #path: image datablock, least recently used first
+        self.sizes = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+
+    def load(self, path):
+        path = os.path.normpath(os.path.abspath(path))
+        image = self.images.get(path)
+        if image is not None and image.name in bpy.data.images:
+            self.images.move_to_end(path)
+            self.hits += 1
+            return image
+        image = bpy.data.images.load(path, check_existing=True) #Reuses an image already in the blend data
+        self.images[path] = image
+        self.sizes[path] = self.image_bytes(image)
+        self.loads += 1
+        self.evict(keep=path)
+        return image
+
+
+    def image_bytes(self, image):
+        width, height = image.size
+        bytes_per_channel = 4 if image.is_float else 1
+        return width*height*max(image.channels, 1)*bytes_per_channel
+
+
+    def memory(self):
+        return sum(self.sizes.values())
+
+
+    def evict(self, keep=None):
+        for path in list(self.images):
+            if self.memory() <= self.max_bytes:
+                break
+            image = self.images[path]
+            if path == keep:
+                continue
+            if image.name in bpy.data.images and image.users > 0:
+                continue #Still in use
+            del self.images[path]
+            del self.sizes[path]
+            if image.name in bpy.data.images:
+                bpy.data.images.remove(image)
+            self.evictions += 1
+
+
+    def summary(self):
+        return "Asset cache: " + str(len(self.images)) + " images, " + str(round(self.memory()/(1024*1024))) + " MB, " + str(self.loads) + " loads, " + str(self.hits) + " hits, " + str(self.evictions) + " evictions"
 
-class ModalTimerOperator(bpy.types.Operator):
-    #Operator which runs itself from a timer
-    bl_idname = "wm.modal_timer_operator"
-    bl_label = "Modal Timer Operator"
+
+class CablesScene:
+    #Scene randomization and rendering, shared by the interactive operator and the headless batch mode
 
     #Variation limits. Dummy values, adjust depending on dimensions and mass of your cables
     cables_list = ['cable1', 'cable2', 'cable3', 'cable4', 'cable5', 'cable6', 'cable7', 'cable8'] #Maximum number of cables in the scene
@@ -35,6 +101,16 @@ class ModalTimerOperator(bpy.types.Operator):
     aligned_opt = True
     close_bkg_opt = True
     HDR_light_opt = False
+    asset_cache_mb = 4096 #Memory budget of the loaded HDRIs and textures
+    asset_cache = None
+    adjusted_materials = []
+    output_format = "png" #"png": two PNG files per sample. "shards": tar shards with a metadata index (segmentation/shards.py)
+    samples_per_shard = 500
+    category = ""
+    light = ""
+    hdr_name = None
+    single_pass_mask = True #Mask from the cryptomatte pass of the image render. False: second render with white cables
+    render_time = 0
 
     #Define how many images to create from each category
     images_type = {'close': {'n': 3000, 'aligned': False, 'close_bkg': True, 'HDR_light': False, 'dir': 'train_imgs_close\\'},
@@ -55,114 +131,146 @@ class ModalTimerOperator(bpy.types.Operator):
     path_print = current_path+"\\info.txt"
 
 
-    def modal(self, context, event):
+    def setup_scene(self):
         """
-        Manager method: Checks the animation status and calls the cancel method when the maximum frame is reached
+        Gets the possible HDRs and floor materials. The textures of each floor material are loaded the first time it is used
         """
-        if bpy.context.scene.frame_current > 100:
-            self.cancel(context) #When frame 100 is reached, it stops the animation and renders the images
-        if event.type == 'TIMER':
-            self.count += 1
-        return {'PASS_THROUGH'}
-
-
-    def execute(self, context):
-        wm = context.window_manager
-        #Get possible HDRs
-        self.hdr_names = os.listdir(self.hdr_path)
-        #Get possible floor materials
+        if CablesScene.asset_cache is None:
+            CablesScene.asset_cache = AssetCache(self.asset_cache_mb) #One per Blender process
+        self.hdr_names = sorted(os.listdir(self.hdr_path)) #Same order on every OS, for reproducible runs
         materials_obj = bpy.data.objects['All_materials']
         for material in materials_obj.material_slots:
             mat_name = str(re.findall('"([^"]*)"', str(material))[0])
-            self.floor_materials.append(mat_name)
-        if self.adjust_textures_path:
-            self.adjust_textures()
-            self.adjust_textures_path = False
-        #Configure option parameters based on the iamge category
-        end = True
-        for type in self.images_type:
-            if not (type in self.types_added):
-                end = False
-                self.types_added.append(type)
-            else:
-                continue
-            self.total_img_number = self.images_type[type]['n']
-            self.imgs_path = str(self.general_path) + self.images_type[type]['dir']
-            self.aligned_opt = self.images_type[type]['aligned']
-            self.close_bkg_opt = self.images_type[type]['close_bkg']
-            self.HDR_light_opt = self.images_type[type]['HDR_light']
-            if self.images_type[type]['n']>0:
-                break
-        if end:
-            return {'CANCELLED'}
-        #Apply random modifications
-        self.cables_modifications(context)
-        #Start animating
-        bpy.context.scene.frame_current = 0
-        bpy.ops.screen.animation_play()
-        self._timer = wm.event_timer_add(1, window=context.window)
-        self.count = 0
-        wm.modal_handler_add(self) #Adds modal_handler
-        return {'RUNNING_MODAL'}
+            if mat_name not in self.floor_materials:
+                self.floor_materials.append(mat_name)
+        if self.single_pass_mask:
+            self.setup_mask_pass()
 
 
-    def adjust_textures(self):
+    def set_category(self, type):
         """
-        Loads all the textures and defines the floor materials
+        Configures the option parameters of an image category
         """
-        for material in self.floor_materials:
-            texture_nodes = bpy.data.materials[material].node_tree.nodes[material].node_tree.nodes
-            for node_attrib in self.all_node_attributes:
-                if node_attrib in texture_nodes:
-                    texture_attrib_img_name = (str(texture_nodes[node_attrib].image).split('"')[1]).split('.')[0]
-                    extension_img = texture_nodes[node_attrib].image.filepath.split('.')[-1]
-                    new_texture_attrib_path = self.textures_path + texture_attrib_img_name.split('_')[0] + '\\' + texture_attrib_img_name + "." + extension_img
-                    new_image = bpy.data.images.load(new_texture_attrib_path)
-                    bpy.data.materials[material].node_tree.nodes[material].node_tree.nodes[node_attrib].image = new_image
-                
-    
-    def cancel(self, context):
+        self.category = type
+        self.total_img_number = self.images_type[type]['n']
+        self.imgs_path = str(self.general_path) + self.images_type[type]['dir']
+        self.aligned_opt = self.images_type[type]['aligned']
+        self.close_bkg_opt = self.images_type[type]['close_bkg']
+        self.HDR_light_opt = self.images_type[type]['HDR_light']
+
+
+    def sample_metadata(self):
         """
-        Frame 100 has been reached: Stops the animation and renders images
+        Parameters of the current scene saved in the shards index. Call it before rendering (the cable colors are reset after rendering)
         """
-        bpy.ops.screen.animation_cancel(restore_frame=False)
+        n_cables = len(self.cables_list) - int(self.n_cables_out)
+        return {'category': self.category,
+                'camera_distance': float(self.chosen_distance),
+                'n_cables': n_cables,
+                'cable_colors': [[int(c) for c in color] for color in self.cable_colors[:n_cables]], #The cables out of the scene are the last ones
+                'light': self.light,
+                'hdri': self.hdr_name,
+                'close_bkg': bool(self.close_bkg_opt),
+                'aligned': bool(self.aligned_opt)}
 
-        wm = context.window_manager
-        wm.event_timer_remove(self._timer)
-        
+
+    def store_sample(self, writer, metadata):
+        """
+        Moves the rendered image and mask of the current sample into the shards
+        """
+        files = {}
+        for extension, suffix in [('image.png', '_image.png'), ('mask.png', '_filter.png')]:
+            path = str(self.imgs_path)+self.img_name+suffix
+            with open(path, 'rb') as f:
+                files[extension] = f.read()
+        writer.write(self.img_name, files, metadata)
+        for suffix in ['_image.png', '_filter.png']:
+            os.remove(str(self.imgs_path)+self.img_name+suffix)
+
+
+    def render_sample(self, context):
+        """
+        Renders the image of the current scene at frame 100 and its segmentation mask
+        """
+        start_time = time.time()
         bpy.context.scene.frame_set(100)
-        self.img_name = str(round(time.time()))
         bpy.context.scene.render.filepath = str(self.imgs_path)+self.img_name+'_image.png'
+        if self.single_pass_mask:
+            #The compositor writes the mask during the same render
+            mask_output = bpy.context.scene.node_tree.nodes['cables_mask_output']
+            mask_output.base_path = str(self.imgs_path)
+            mask_output.file_slots[0].path = self.img_name+'_filter'
         bpy.ops.render.render(write_still = True) #Render image
         
-        self.render_filter(context) #Render segmentation mask
-        
-        #Repeats the process for a new image if there are still images to be created
-        if self.img_number < self.total_img_number:
-            self.repeat_process(context)
+        if self.single_pass_mask:
+            #The File Output node appends the frame number to the file name
+            frame_suffix = "{:04d}".format(bpy.context.scene.frame_current)
+            os.replace(str(self.imgs_path)+self.img_name+'_filter'+frame_suffix+'.png', str(self.imgs_path)+self.img_name+'_filter.png')
+            self.cable_colors = []
         else:
-            #Configure option parameters
-            end = True
-            for type in self.images_type:
-                if not (type in self.types_added):
-                    end = False
-                    self.types_added.append(type)
-                else:
-                    continue
-                self.total_img_number = self.images_type[type]['n']
-                self.imgs_path = str(self.general_path) + self.images_type[type]['dir']
-                self.aligned_opt = self.images_type[type]['aligned']
-                self.close_bkg_opt = self.images_type[type]['close_bkg']
-                self.HDR_light_opt = self.images_type[type]['HDR_light']
-                if self.images_type[type]['n']>0:
-                    break
-            if end:
-                return {'CANCELLED'}
-            else:
-                self.img_number = 0
-                self.repeat_process(context)
+            self.render_filter(context) #Render segmentation mask
+        self.render_time = time.time() - start_time
 
-        
+
+    def setup_mask_pass(self):
+        """
+        Adds to the compositor a cryptomatte matte of the cables, binarized and saved with a File Output node,
+        so the segmentation mask is obtained from the image render (no second render nor PNG read back)
+        """
+        scene = bpy.context.scene
+        scene.use_nodes = True
+        bpy.context.view_layer.use_pass_cryptomatte_object = True
+        nodes = scene.node_tree.nodes
+        links = scene.node_tree.links
+        for name in ['cables_mask_matte', 'cables_mask_threshold', 'cables_mask_output']:
+            if name in nodes:
+                nodes.remove(nodes[name])
+        render_layers = next((node for node in nodes if node.type == 'R_LAYERS'), None)
+        if render_layers is None:
+            render_layers = nodes.new('CompositorNodeRLayers')
+        composite = next((node for node in nodes if node.type == 'COMPOSITE'), None)
+        if composite is None:
+            composite = nodes.new('CompositorNodeComposite')
+            links.new(render_layers.outputs['Image'], composite.inputs['Image'])
+
+        matte = nodes.new('CompositorNodeCryptomatteV2')
+        matte.name = 'cables_mask_matte'
+        matte.source = 'RENDER'
+        matte.scene = scene
+        matte.matte_id = ",".join(self.cables_list)
+        links.new(render_layers.outputs['Image'], matte.inputs['Image'])
+
+        threshold = nodes.new('CompositorNodeMath')
+        threshold.name = 'cables_mask_threshold'
+        threshold.operation = 'GREATER_THAN'
+        threshold.inputs[1].default_value = 60/255 #Same threshold as the binarization of the rendered mask
+        links.new(matte.outputs['Matte'], threshold.inputs[0])
+
+        output = nodes.new('CompositorNodeOutputFile')
+        output.name = 'cables_mask_output'
+        output.format.file_format = 'PNG'
+        output.format.color_mode = 'RGB'
+        output.format.color_depth = '8'
+        links.new(threshold.outputs['Value'], output.inputs[0])
+
+
+    def adjust_textures(self, material):
+        """
+        Loads the textures of a floor material (only the first time the material is used)
+        """
+        if not self.adjust_textures_path or material in self.adjusted_materials:
+            return
+        texture_nodes = bpy.data.materials[material].node_tree.nodes[material].node_tree.nodes
+        for node_attrib in self.all_node_attributes:
+            if node_attrib in texture_nodes:
+                texture_attrib_img_name = (str(texture_nodes[node_attrib].image).split('"')[1]).split('.')[0]
+                extension_img = texture_nodes[node_attrib].image.filepath.split('.')[-1]
+                new_texture_attrib_path = self.textures_path + texture_attrib_img_name.split('_')[0] + '\\' + texture_attrib_img_name + "." + extension_img
+                new_image = self.asset_cache.load(new_texture_attrib_path)
+                bpy.data.materials[material].node_tree.nodes[material].node_tree.nodes[node_attrib].image = new_image
+        self.adjusted_materials.append(material)
+                
+    
     def render_filter(self, context):
         """
         Renders the segmentation mask: Changes cables material to white color and floor material to black color, renders the image, binarizes it, and saves it
@@ -198,21 +306,6 @@ class ModalTimerOperator(bpy.types.Operator):
         self.cable_colors = []
          
             
-    def repeat_process(self, context):
-        """
-        Applies random modifications and repeats the process to create a new image
-        """
-        wm = context.window_manager
-        bpy.context.scene.frame_current = 0
-        self.cables_modifications(context) #Apply random modifications
-        bpy.ops.screen.animation_play()
-        self._timer = wm.event_timer_add(1, window=context.window)
-        self.count = 0
-        self.img_number += 1
-        wm.modal_handler_add(self)
-        return {'RUNNING_MODAL'}
-    
-    
     def cables_modifications(self, context):
         """
         Applies random modifications to the cables, floor, HDRI, wind, lights, and camera
@@ -224,6 +317,7 @@ class ModalTimerOperator(bpy.types.Operator):
         floor_obj = bpy.data.objects['Floor']
         if self.close_bkg_opt:
             floor_obj.hide_render = False
+            self.adjust_textures(new_floor_material)
             # Get material
             mat = bpy.data.materials.get(new_floor_material)
             floor_obj.data.materials[0] = mat
@@ -269,7 +363,9 @@ class ModalTimerOperator(bpy.types.Operator):
         if not self.HDR_light_opt:
             bpy.data.worlds["World"].node_tree.nodes["Mix Shader"].inputs[0].default_value = 1 #Not HDR
             light_type = random.randint(1, 2) #1/2 point light, 1/2 bar lights
+            self.hdr_name = None
             if light_type != 2:
+                self.light = "point"
                 light_obj = bpy.data.objects["Light"]
                 area_light_obj = bpy.data.objects["Area"]
                 light_obj.hide_render = False
@@ -283,6 +379,7 @@ class ModalTimerOperator(bpy.types.Operator):
                 light_obj.data.energy = (random.randint(800, 1500)) #Power
                 light_obj.data.shadow_soft_size = float(random.randint(1, 20))/10 #Radius (how much shadow)
             else:
+                self.light = "area"
                 light_obj = bpy.data.objects["Light"]
                 area_light_obj = bpy.data.objects["Area"]
                 light_obj.hide_render = True
@@ -294,6 +391,7 @@ class ModalTimerOperator(bpy.types.Operator):
         #CHANGE LIGHTS HDR
         else:
             bpy.data.worlds["World"].node_tree.nodes["Mix Shader"].inputs[0].default_value = 0 #HDR
+            self.light = "hdr"
             light_obj = bpy.data.objects["Light"]
             area_light_obj = bpy.data.objects["Area"]
             light_obj.hide_render = True
@@ -301,7 +399,8 @@ class ModalTimerOperator(bpy.types.Operator):
             if self.close_bkg_opt:
                 hdr_name = "machine_shop_01_4k.hdr"
                 new_hdr_path = self.hdr_path + "//" + hdr_name
-                new_hdr = bpy.data.images.load(new_hdr_path)
+                new_hdr = self.asset_cache.load(new_hdr_path)
+                self.hdr_name = hdr_name
                 bpy.data.worlds["World"].node_tree.nodes["Environment Texture"].image = new_hdr
                 x_rot_HDR = [0, math.pi/2]
                 bpy.data.worlds["World"].node_tree.nodes["Mapping"].inputs[0].default_value[2] = random.choice(x_rot_HDR)
@@ -312,7 +411,8 @@ class ModalTimerOperator(bpy.types.Operator):
             else:
                 hdr_name = str(random.choice(self.hdr_names))
                 new_hdr_path = self.hdr_path + "//" + hdr_name
-                new_hdr = bpy.data.images.load(new_hdr_path)
+                new_hdr = self.asset_cache.load(new_hdr_path)
+                self.hdr_name = hdr_name
                 bpy.data.worlds["World"].node_tree.nodes["Environment Texture"].image = new_hdr
                 #Rotate in Z
                 rot_deg = float(random.randint(-180, 180)) #Light position: degrees
@@ -372,6 +472,179 @@ class ModalTimerOperator(bpy.types.Operator):
         bpy.data.materials[mat_name].node_tree.nodes["ColorRamp.001"].color_ramp.elements[1].position = random.randint(60, 70)/100
 
 
+class ModalTimerOperator(CablesScene, bpy.types.Operator):
+    #Operator which runs itself from a timer
+    bl_idname = "wm.modal_timer_operator"
+    bl_label = "Modal Timer Operator"
+
+
+    def modal(self, context, event):
+        """
+        Manager method: Checks the animation status and calls the cancel method when the maximum frame is reached
+        """
+        if bpy.context.scene.frame_current > 100:
+            self.cancel(context) #When frame 100 is reached, it stops the animation and renders the images
+        if event.type == 'TIMER':
+            self.count += 1
+        return {'PASS_THROUGH'}
+
+
+    def execute(self, context):
+        wm = context.window_manager
+        #Get possible HDRs and floor materials
+        self.setup_scene()
+        #Configure option parameters based on the iamge category
+        end = True
+        for type in self.images_type:
+            if not (type in self.types_added):
+                end = False
+                self.types_added.append(type)
+            else:
+                continue
+            self.set_category(type)
+            if self.images_type[type]['n']>0:
+                break
+        if end:
+            return {'CANCELLED'}
+        #Apply random modifications
+        self.cables_modifications(context)
+        #Start animating
+        bpy.context.scene.frame_current = 0
+        bpy.ops.screen.animation_play()
+        self._timer = wm.event_timer_add(1, window=context.window)
+        self.count = 0
+        wm.modal_handler_add(self) #Adds modal_handler
+        return {'RUNNING_MODAL'}
+
+
+    def cancel(self, context):
+        """
+        Frame 100 has been reached: Stops the animation and renders images
+        """
+        bpy.ops.screen.animation_cancel(restore_frame=False)
+
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        
+        self.img_name = str(time.time_ns()) #Unique even if two renders finish in the same second
+        self.render_sample(context)
+        
+        #Repeats the process for a new image if there are still images to be created
+        if self.img_number < self.total_img_number:
+            self.repeat_process(context)
+        else:
+            #Configure option parameters
+            end = True
+            for type in self.images_type:
+                if not (type in self.types_added):
+                    end = False
+                    self.types_added.append(type)
+                else:
+                    continue
+                self.set_category(type)
+                if self.images_type[type]['n']>0:
+                    break
+            if end:
+                return {'CANCELLED'}
+            else:
+                self.img_number = 0
+                self.repeat_process(context)
+
+
+    def repeat_process(self, context):
+        """
+        Applies random modifications and repeats the process to create a new image
+        """
+        wm = context.window_manager
+        bpy.context.scene.frame_current = 0
+        self.cables_modifications(context) #Apply random modifications
+        bpy.ops.screen.animation_play()
+        self._timer = wm.event_timer_add(1, window=context.window)
+        self.count = 0
+        self.img_number += 1
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class HeadlessGenerator(CablesScene):
+    #Batch mode (blender -b): the cloth simulation is baked by stepping the frames instead of playing the animation with a timer
+
+
+    def simulate(self, last_frame=100):
+        """
+        Simulates the cloth from frame 0 to last_frame, frame by frame
+        """
+        scene = bpy.context.scene
+        try:
+            bpy.ops.ptcache.free_bake_all() #Discards the simulation of the previous sample
+        except RuntimeError:
+            pass
+        for frame in range(0, last_frame + 1):
+            scene.frame_set(frame)
+
+
+    def sample_exists(self):
+        return os.path.exists(str(self.imgs_path)+self.img_name+'_image.png') and os.path.exists(str(self.imgs_path)+self.img_name+'_filter.png')
+
+
+    def generate(self, categories=None, worker=0, workers=1, seed=0):
+        """
+        Generates the images of the given categories with index worker, worker+workers, worker+2*workers, ...
+        Every sample uses its own seed (from the base seed, category and index) and a fixed name, so the result does not
+        depend on the number of workers and the generation can be resumed: existing samples are skipped.
+        """
+        self.setup_scene()
+        render_times = []
+        for type in (categories or list(self.images_type)):
+            self.set_category(type)
+            if not os.path.exists(self.imgs_path):
+                os.makedirs(self.imgs_path)
+            writer = None
+            if self.output_format == "shards":
+                writer = ShardWriter(self.imgs_path, "w" + str(worker), self.samples_per_shard)
+                written = writer.keys()
+            for index in range(worker, self.total_img_number, workers):
+                self.img_name = "{:06d}".format(index)
+                if (self.img_name in written) if writer else self.sample_exists():
+                    continue
+                start_time = time.time()
+                random.seed(sample_seed(seed, type, index))
+                self.cables_modifications(bpy.context)
+                self.simulate()
+                metadata = self.sample_metadata()
+                self.render_sample(bpy.context)
+                if writer:
+                    self.store_sample(writer, metadata)
+                render_times.append(self.render_time)
+                print(type + " - " + self.img_name + " - Time: " + str(time.time() - start_time) + "s - Render time: " + str(self.render_time) + "s", flush=True)
+            if writer:
+                writer.close()
+        if render_times:
+            mode = "single pass" if self.single_pass_mask else "two passes"
+            print("Mean render time (image and mask, " + mode + "): " + str(sum(render_times)/len(render_times)) + "s over " + str(len(render_times)) + " samples", flush=True)
+        print(self.asset_cache.summary(), flush=True)
+
+
+def sample_seed(seed, type, index):
+    return zlib.crc32((str(seed) + "|" + type + "|" + str(index)).encode("utf-8"))
+
+
+def parse_batch_args(argv):
+    parser = argparse.ArgumentParser(description="Headless generation of the synthetic cables dataset")
+    parser.add_argument("--categories", default=None, help="Comma separated image categories (default: all)")
+    parser.add_argument("--worker", type=int, default=0, help="Index of this worker")
+    parser.add_argument("--workers", type=int, default=1, help="Total number of workers")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed")
+    parser.add_argument("--two-pass-mask", action="store_true", help="Render the mask in a second render (to compare the render time)")
+    parser.add_argument("--asset-cache-mb", type=int, default=CablesScene.asset_cache_mb, help="Memory budget of the loaded HDRIs and textures")
+    parser.add_argument("--format", default=CablesScene.output_format, choices=["png", "shards"], help="Output: PNG files or tar shards with a metadata index")
+    parser.add_argument("--samples-per-shard", type=int, default=CablesScene.samples_per_shard, help="Samples per shard")
+    args = parser.parse_args(argv)
+    if args.categories:
+        args.categories = args.categories.split(",")
+    return args
+
+
 def register():
     bpy.utils.register_class(ModalTimerOperator)
 
@@ -381,5 +654,15 @@ def unregister():
 
 
 if __name__ == "__main__":
-    register()
-    bpy.ops.wm.modal_timer_operator()    
\ No newline at end of file
+    if "--" in sys.argv:
+        #Headless batch mode: blender -b scene.blend --python synthetic_cables_generation.py -- --worker 0 --workers 4
+        args = parse_batch_args(sys.argv[sys.argv.index("--")+1:])
+        generator = HeadlessGenerator()
+        generator.single_pass_mask = not args.two_pass_mask
+        generator.asset_cache_mb = args.asset_cache_mb
+        generator.output_format = args.format
+        generator.samples_per_shard = args.samples_per_shard
+        generator.generate(args.categories, args.worker, args.workers, args.seed)
+    else:
+        register()
+        bpy.ops.wm.modal_timer_operator()    
\ No newline at end of file
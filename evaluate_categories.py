@@ -0,0 +1,53 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import time
+import numpy as np
+from segmentation.dataset import find_categories, list_pairs, evaluation_dataset, evaluate_categories
+from segmentation.manifest import write_result_coefficients
+from segmentation.registry import ModelRegistry
+
+#Evaluates the models on real_images and every synthetic_images category in a single pass per model,
+#with a tf.data input pipeline (parallel decoding and resizing, cache and prefetch)
+
+#User selections
+models_to_evaluate = ['unet', 'deeplabv3p', 'fcn', 'fpn', 'linknet', 'pspnet']
+dataset_folders = ["real_images", "synthetic_images"] #Folders searched for images/ and masks/ subfolders
+batch_size = 8 #Number of images predicted at once
+inference_mode = "graph" #"graph", "keras" or "tflite"
+tflite_quantization = "float16"
+cache_images = False #Keep the decoded images in memory after the first model with the same input size (needs RAM for the whole dataset)
+
+#Initialization of variables
+path_root = os.path.dirname(os.path.realpath(__file__))
+path_models_dir = os.path.join(path_root, "models")
+registry = ModelRegistry(path_models_dir) #Input size, normalization and threshold of every model
+categories = find_categories(path_root, dataset_folders)
+image_paths, mask_paths, category_ids, category_names = list_pairs(categories)
+for category in category_names:
+    print(category + ": " + str(int(np.sum(category_ids == category_names.index(category)))) + " images")
+
+datasets = {}
+metrics_avg = {}
+for model_name in models_to_evaluate:
+    IMAGE_SIZE = registry.image_size(model_name)
+    dataset_key = (IMAGE_SIZE, registry.spec(model_name).normalization)
+    if dataset_key not in datasets:
+        datasets[dataset_key] = evaluation_dataset(image_paths, mask_paths, category_ids, IMAGE_SIZE, batch_size,
+                                                   cache="" if cache_images else None,
+                                                   normalize_fn=registry.normalize_fn(model_name))
+    print("Loading: " + str(model_name) + " model...")
+    predict_fn = registry.load(model_name, inference_mode, tflite_quantization, batch_size)
+    start_time = time.time()
+    metrics, _, _ = evaluate_categories(predict_fn, datasets[dataset_key], category_names, registry.threshold(model_name), verbose=False)
+    total_time = time.time() - start_time
+    print(str(model_name) + " - " + str(len(image_paths)) + " images - Total time: " + str(total_time) + "s (" + str(len(image_paths)/total_time) + " images/s)")
+
+    #Results of every category
+    for category in metrics:
+        name = model_name + " - " + category
+        metrics_avg[name] = {metric_i: float(np.mean(metrics[category][metric_i])) if len(metrics[category][metric_i]) else float("nan")
+                             for metric_i in ['IoU', 'Dice']}
+        print('\t- ' + category + ': IoU ' + str(metrics_avg[name]['IoU']) + ', Dice ' + str(metrics_avg[name]['Dice']))
+    print("---------------------------")
+
+write_result_coefficients(os.path.join(path_root, "category_coefficients.txt"), metrics_avg)
@@ -0,0 +1,23 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import time
+from segmentation.tflite_backend import export_tflite, calibration_images
+from segmentation.registry import ModelRegistry
+
+#User selections
+quantization = "float16" #"float16", "int8" (calibrated on synthetic_images) or "dynamic"
+models_to_export = ['unet', 'deeplabv3p', 'fcn', 'fpn', 'linknet', 'pspnet']
+n_calibration = 100 #Number of synthetic images used to calibrate the int8 quantization
+
+#Initialization of variables
+path_root = os.path.dirname(os.path.realpath(__file__)) + "\\"
+path_models_dir = path_root + "models\\"
+registry = ModelRegistry(path_models_dir) #Input size and folder of every model
+calibration_paths = calibration_images(path_root + "synthetic_images")
+
+for model_name in models_to_export:
+    start_time = time.time()
+    output_path = registry.tflite_path(model_name, quantization)
+    print("Exporting: " + str(model_name) + " model (" + quantization + ")...")
+    export_tflite(registry.path(model_name), output_path, registry.image_size(model_name), quantization, calibration_paths, n_calibration)
+    print("Saved: " + output_path + " - " + str(os.path.getsize(output_path)/1024**2) + " MB - Export time: " + str(time.time() - start_time) + "s")
@@ -0,0 +1,120 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import json
+import time
+import concurrent.futures
+import numpy as np
+import cv2 as cv
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from segmentation.batching import DynamicBatcher, QueueFullError, BatcherClosedError
+from segmentation.postprocess import prediction_to_mask
+from segmentation.registry import ModelRegistry
+
+#User selections
+host = "localhost"
+port = 8080
+models_to_serve = ['unet', 'deeplabv3p', 'fcn', 'fpn', 'linknet', 'pspnet'] #Models kept loaded
+inference_mode = "graph" #"graph": traced tf.function with warm-up, "keras": model.predict, "tflite": quantized TFLite model
+tflite_quantization = "float16"
+max_batch_size = 8 #Maximum number of requests predicted at once
+max_wait_ms = 5 #Maximum time a request waits for other requests to fill a batch
+max_queue = 64 #Maximum number of pending requests per model, beyond that requests are rejected (HTTP 503)
+request_timeout = 30 #In s, requests not predicted in time get HTTP 504 (HTTP 500 if the model fails)
+
+#Initialization of variables
+path_models_dir = os.path.dirname(os.path.realpath(__file__)) + "\\models\\"
+registry = ModelRegistry(path_models_dir) #Input size, normalization and threshold of every model
+batchers = {}
+
+
+class SegmentationHandler(BaseHTTPRequestHandler):
+    """
+    POST /segment/<model_name> with an encoded image (PNG/JPEG) as body: returns the predicted mask as PNG.
+    GET /metrics: throughput, batch sizes and queue/inference latency of every model. GET /health: status.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send_json(200, {model_name: batcher.stats() for model_name, batcher in batchers.items()})
+        elif path == "/health":
+            self._send_json(200, {'status': 'ok', 'models': list(batchers)})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        start_time = time.time()
+        parts = urlparse(self.path).path.strip("/").split("/")
+        if self.headers.get("Content-Length") is None:
+            self.close_connection = True
+            return self._send_json(411, {'error': 'Content-Length header required'})
+        try:
+            content_length = int(self.headers["Content-Length"])
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.close_connection = True #The body cannot be skipped without its length
+            return self._send_json(400, {'error': 'Invalid Content-Length header'})
+        body = self.rfile.read(content_length)
+        if len(parts) != 2 or parts[0] != "segment":
+            return self._send_json(404, {'error': 'Not found'})
+        model_name = parts[1]
+        if model_name not in batchers:
+            return self._send_json(404, {'error': 'Unknown model: ' + model_name})
+
+        #Preprocessing, same as segment_one.py
+        image = cv.imdecode(np.frombuffer(body, dtype=np.uint8), cv.IMREAD_COLOR)
+        if image is None:
+            return self._send_json(400, {'error': 'The body is not a valid image'})
+        IMAGE_SIZE = registry.image_size(model_name)
+        x = registry.normalize(model_name, cv.resize(image, (IMAGE_SIZE, IMAGE_SIZE)))
+
+        try:
+            pred, queue_time, inference_time = batchers[model_name].predict(x, timeout=request_timeout)
+        except (QueueFullError, BatcherClosedError):
+            return self._send_json(503, {'error': 'Server busy, try again later'}, {'Retry-After': '1'})
+        except concurrent.futures.TimeoutError:
+            return self._send_json(504, {'error': 'Prediction timed out after ' + str(request_timeout) + 's'})
+        except Exception as e:
+            return self._send_json(500, {'error': 'Prediction failed: ' + repr(e)})
+        ok, encoded = cv.imencode(".png", prediction_to_mask(pred, registry.threshold(model_name)))
+        self._send(200, encoded.tobytes(), "image/png", {'X-Queue-Time': str(queue_time), 'X-Inference-Time': str(inference_time),
+                                                         'X-Total-Time': str(time.time() - start_time)})
+
+    def log_message(self, format, *args):
+        pass #Request logs would dominate the output under load
+
+    def _send_json(self, status, content, headers=None):
+        self._send(status, json.dumps(content).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+#Load the models
+for model_name in models_to_serve:
+    print("Loading: " + str(model_name) + " model...")
+    start_time = time.time()
+    predict_fn = registry.load(model_name, inference_mode, tflite_quantization, max_batch_size)
+    print("Load and warm-up time: " + str(time.time() - start_time) + "s")
+    batchers[model_name] = DynamicBatcher(predict_fn, max_batch_size, max_wait_ms/1000, max_queue)
+
+#Serve requests
+server = ThreadingHTTPServer((host, port), SegmentationHandler)
+print("Serving on http://" + host + ":" + str(port))
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
+    for batcher in batchers.values():
+        batcher.close()
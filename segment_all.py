@@ -1,102 +1,249 @@
 import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
-import tensorflow as tf
 import numpy as np
 import cv2 as cv
 import time
 import glob
+import json
+from segmentation.engine import InferenceEngine, AsyncWriter, load_ground_truth, read_resized
+from segmentation.metrics import segmentation_metrics, confusion_matrix, metrics_from_counts
+from segmentation.postprocess import prediction_to_mask
+from segmentation.sweep import run_sweep
+from segmentation.cache import InputCache
+from segmentation.tiling import predict_tiled
+from segmentation.ensemble import Ensemble, read_multi_size
+from segmentation.manifest import PredictionManifest, model_fingerprint, write_result_coefficients
+from segmentation.profiling import Profiler
+from segmentation.registry import ModelRegistry, WarmPool
+from segmentation.instances import extract_instances, instances_to_json
+from concurrent.futures import ThreadPoolExecutor
 
 #User selection
 images_folder = "real_images"
 #images_folder = "synthetic_images\\close_concentrated_light"
+batch_size = 8 #Number of images predicted at once
+num_workers = 4 #Threads used to read and resize the images
+inference_mode = "graph" #"graph": traced tf.function with warm-up, "keras": model.predict, "tflite": quantized TFLite model
+tflite_quantization = "float16" #TFLite model exported with export_tflite.py ("float16", "int8" or "dynamic")
+parallel_models = 0 #Number of models evaluated in parallel worker processes (0: one model after another)
+parallel_models_gpu = True #The worker processes share the GPUs, each one allocating GPU memory as it needs it (TensorFlow memory growth) instead of reserving all of it. False: the workers run on the CPU
+intra_op_threads = 0 #TensorFlow intra-op threads per worker process (0: TensorFlow default)
+inter_op_threads = 0 #TensorFlow inter-op threads per worker process (0: TensorFlow default)
+tiled_inference = False #Segment the images at native resolution with overlapping tiles instead of resizing them (parallel_models = 0)
+tile_overlap = 64 #Overlap between tiles in pixels
+ensemble_fusion = None #Also evaluate the ensemble of all the models: "mean", "vote", "weighted" (None: no ensemble)
+ensemble_weights = {'unet':1.0, 'deeplabv3p':1.0, 'fcn':1.0, 'fpn':1.0, 'linknet':1.0, 'pspnet':1.0} #Weights of the "weighted" fusion
+ensemble_latency_budget_ms = None #Skip the slowest models to keep the ensemble within this time per image (None: all models)
+incremental = False #Only predict new or changed images, reusing the saved predictions and their metrics (parallel_models = 0, tiled_inference = False)
+instance_extraction = False #Extract the cable instances (connected components) and their centerline polylines from the predicted masks (saved in predictions\<model>_instances.json)
+instance_min_area = 50 #Minimum area in pixels of a cable instance
+model_pool_mb = 4096 #Memory limit of the weights of the models kept loaded (the ensemble reuses them instead of loading them again)
+cache_size_mb = 2048 #Size limit of the cache of resized images and binarized masks in cache\ (0: no cache)
+profiling = False #Record the time of every stage of every image and save a Chrome trace and the slowest images in <images_folder>\profile\ (parallel_models = 0)
+profiling_tf_trace = False #Also capture TensorFlow profiler traces of the forward passes (TensorBoard, needs profiling = True)
 
 #Initialization of variables
-model_list = {'unet':512, 'deeplabv3p':512, 'fcn':512, 'fpn':512,'linknet':512, 'pspnet':480} #Model names and img sizes
 metrics = {}
 metrics_avg = {}
 path_dir = os.path.dirname(os.path.realpath(__file__)) + "\\"+images_folder+"\\"
 path_image_dir = path_dir + "images\\"
 path_masks_dir = path_dir + "masks\\"
+path_models_dir = os.path.dirname(os.path.realpath(__file__)) + "\\models\\"
+registry = ModelRegistry(path_models_dir) #Input size, normalization, threshold and path of every model
+model_pool = WarmPool(registry, model_pool_mb, inference_mode, tflite_quantization, warmup_batch_size=batch_size)
 image_list = [f for f in os.listdir(path_image_dir) if os.path.isfile(os.path.join(path_image_dir, f))]
+path_cache_dir = os.path.dirname(os.path.realpath(__file__)) + "\\cache\\"
+input_cache = InputCache(path_cache_dir, cache_size_mb*1024**2) if cache_size_mb > 0 else None
+read_image = input_cache.get_image if input_cache is not None else None
+read_mask = input_cache.get_mask if input_cache is not None else load_ground_truth
+manifest = PredictionManifest(path_dir + "predictions\\manifest.json") if incremental else None
+profiler = Profiler(profiling, tf_trace_dir=path_dir + "profile\\tf_trace" if profiling_tf_trace else None)
 
 
-def compare_masks(mask1, mask2):
-    # Convert masks to numpy arrays
-    mask1 = np.array(mask1, dtype=np.uint8)
-    mask2 = np.array(mask2, dtype=np.uint8)
-
-    # Convert masks to binary (0 and 1)
-    mask1 = mask1 > 0
-    mask2 = mask2 > 0
-
-    true_positives = np.count_nonzero(np.logical_and(mask1, mask2))
-    false_positives = np.count_nonzero(np.logical_and(mask1, np.logical_not(mask2)))
-    false_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), mask2))
-    true_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), np.logical_not(mask2)))
-
-    return true_positives, false_positives, false_negatives, true_negatives
+def segment_model(model_name):
+  IMAGE_SIZE = registry.image_size(model_name)
+  prediction_threshold = registry.threshold(model_name)
+  path_model = registry.path(model_name)
+  directory_predictions = path_dir + "predictions\\" + model_name
 
+  #Images to predict: all of them, or only the new or changed ones in incremental mode
+  run_list = image_list
+  use_manifest = manifest is not None and not tiled_inference
+  path_instances = path_dir + "predictions\\" + model_name + "_instances.json"
+  instances = {}
+  if instance_extraction and use_manifest and os.path.exists(path_instances):
+    with open(path_instances) as f:
+      instances = {image_name: value for image_name, value in json.load(f).items() if image_name in image_list}
+  if use_manifest:
+    path_weights = registry.tflite_path(model_name, tflite_quantization) if inference_mode == "tflite" else path_model
+    manifest.model_entry(model_name, model_fingerprint(path_weights, inference_mode, registry.spec(model_name).normalization), IMAGE_SIZE, prediction_threshold)
+    manifest.prune(model_name, image_list)
+    stale = set(manifest.stale_images(model_name, image_list, path_image_dir, path_masks_dir, directory_predictions))
+    #Images without instances (e.g. predicted before instance_extraction was enabled) are predicted again
+    if instance_extraction:
+      stale.update(image_name for image_name in image_list if image_name not in instances)
+    run_list = [image_name for image_name in image_list if image_name in stale]
+    print(str(model_name) + ": " + str(len(image_list)-len(run_list)) + " predictions up to date, " + str(len(run_list)) + " to compute")
+    if not run_list:
+      return metrics_from_counts(manifest.counts(model_name, image_list))
 
-for model_name in model_list:
   #Load the model
-  IMAGE_SIZE = model_list[model_name]
-  path_model = os.path.dirname(os.path.realpath(__file__)) + "\\models\\"+model_name
   print("Loading: " + str(model_name) + " model...")
-  model = tf.keras.models.load_model(path_model, compile=False)
-  model.compile(optimizer='adam',
-                loss=tf.keras.losses.BinaryCrossentropy(),
-                metrics=[tf.keras.metrics.FalseNegatives()])
-  
+  with profiler.span("load", model=model_name):
+    predict_fn, _, load_time = model_pool.get(model_name)
+  print("Load time: " + str(load_time) + "s" + (" (warm-up: " + str(predict_fn.warmup_time) + "s)" if getattr(predict_fn, "warmup_time", None) is not None else ""))
+
+  if tiled_inference:
+    return segment_model_tiled(model_name, predict_fn)
+
   #Initialize variables
-  metrics[model_name] = {'TP':[], 'FP':[], 'TN':[], 'FN':[], 'IoU':[], 'Dice':[]}
-  metrics_avg[model_name] = {}
-  directory_predictions = path_dir + "predictions\\" + model_name
+  pred_masks = np.zeros((len(run_list), IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+  gt_masks = np.zeros((len(run_list), IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
   if not os.path.exists(directory_predictions):
       os.makedirs(directory_predictions)
 
+  #Batched inference: images are loaded and predictions saved in background threads
+  image_paths = [path_image_dir+image_name for image_name in run_list]
+  #With profiling, every stage of every image is recorded (the functions are not wrapped otherwise)
+  read_image_fn = profiler.wrap("decode", read_image or read_resized, model_name)
+  read_mask_fn = profiler.wrap("ground_truth", read_mask, model_name)
+  engine = InferenceEngine(predict_fn, IMAGE_SIZE, batch_size=batch_size, num_workers=num_workers, read_fn=read_image_fn,
+                           normalize_fn=registry.normalize_fn(model_name))
   i=0
-  for image_name in image_list:
-    #Load image
-    ori_x = cv.imread(path_image_dir+image_name, cv.IMREAD_COLOR)
-    ori_x = cv.resize(ori_x, (IMAGE_SIZE, IMAGE_SIZE))
-    x = ori_x/255.0
-    x = x.astype(np.float32)
-    x = np.expand_dims(x, axis=0)
-
-    #Predict and save result
-    start_time = time.time()
-    pred_mask = model.predict(x)[0] > 0.5
-    prediction_image = tf.keras.preprocessing.image.array_to_img(pred_mask)
-    prediction_image2 = tf.keras.preprocessing.image.img_to_array(prediction_image)
-    pred_image_cv2 = cv.cvtColor(prediction_image2.astype('uint8'), cv.COLOR_RGB2BGR)
-    saved_path = path_dir + "predictions\\" + model_name + "\\" + image_name
-    cv.imwrite(saved_path, pred_image_cv2)
-    print(str(model_name) + "-" + str(i) + " - Total time: " + str(time.time() - start_time) + "s")
-    i+=1
-
-    #Compare prediction with ground truth
-    image_gray_segmented = cv.cvtColor(pred_image_cv2, cv.COLOR_BGR2GRAY)
-    mask_ground_truth = cv.imread(path_masks_dir+image_name, cv.IMREAD_GRAYSCALE)
-    if mask_ground_truth.shape[0] != IMAGE_SIZE:
-      mask_ground_truth = cv.resize(mask_ground_truth, (IMAGE_SIZE, IMAGE_SIZE))
-    _, binary_image_GT = cv.threshold(mask_ground_truth, 60, 255, cv.THRESH_BINARY)
-
-    #Get metrics
-    tp_i, fp_i, fn_i, tn_i = compare_masks(image_gray_segmented, binary_image_GT)
-    metrics[model_name]['TP'].append(tp_i)
-    metrics[model_name]['FP'].append(fp_i)
-    metrics[model_name]['FN'].append(fn_i)
-    metrics[model_name]['TN'].append(tn_i)  
-    metrics[model_name]['IoU'].append(tp_i/(tp_i+fp_i+fn_i))
-    metrics[model_name]['Dice'].append((2*tp_i)/((2*tp_i)+fp_i+fn_i))
-
-  #Results model
-  for metric_i in metrics[model_name]:
-    metrics_avg[model_name][metric_i] = sum(metrics[model_name][metric_i])/len(metrics[model_name][metric_i])
-
-#Print results summary
-for model_name in model_list:
-    print(model_name + ":")
+  with profiler.tf_trace(), AsyncWriter(write_fn=profiler.wrap("write", cv.imwrite, model_name)) as writer:
+    for batch_paths, pred_batch in engine.run(image_paths):
+      profiler.add_batch("forward", engine.last_predict_start, engine.last_predict_time, model_name, run_list[i:i+len(batch_paths)])
+      with profiler.span("postprocess", model=model_name):
+        pred_masks[i:i+len(pred_batch)] = prediction_to_mask(pred_batch, prediction_threshold)
+      message = str(model_name) + "-" + str(i) + ":" + str(i+len(batch_paths)-1) + " - Batch prediction time: " + str(engine.last_predict_time) + "s"
+      if instance_extraction:
+        #Cable instances and centerlines of the whole batch of masks
+        start_time = time.perf_counter()
+        batch_instances = extract_instances(pred_masks[i:i+len(pred_batch)], min_area=instance_min_area, num_workers=num_workers)
+        instances_time = time.perf_counter() - start_time
+        profiler.add_batch("instances", start_time, instances_time, model_name, run_list[i:i+len(batch_paths)])
+        for image_name, image_instances in zip(run_list[i:i+len(batch_paths)], batch_instances):
+          instances[image_name] = instances_to_json(image_instances)
+        message += " - Instance extraction time: " + str(instances_time) + "s"
+      print(message)
+      for pred_mask in pred_masks[i:i+len(pred_batch)]:
+        image_name = run_list[i]
+
+        #Save result
+        saved_path = path_dir + "predictions\\" + model_name + "\\" + image_name
+        writer.write(saved_path, pred_mask)
+
+        #Ground truth
+        gt_masks[i] = read_mask_fn(path_masks_dir+image_name, IMAGE_SIZE)
+        i+=1
+
+  if instance_extraction:
+    with open(path_instances, "w") as f:
+      json.dump(instances, f)
+
+  #Get metrics of all the images at once
+  with profiler.span("metrics", model=model_name):
+    counts = confusion_matrix(pred_masks, gt_masks)
+  if use_manifest:
+    for image_name, counts_i in zip(run_list, counts):
+      manifest.update(model_name, image_name, counts_i, path_image_dir, path_masks_dir)
+    manifest.save()
+    return metrics_from_counts(manifest.counts(model_name, image_list))
+  return metrics_from_counts(counts)
+
+
+def segment_model_tiled(model_name, predict_fn):
+  #Images and ground truth are compared at native resolution, so every image can have a different size
+  IMAGE_SIZE = registry.image_size(model_name)
+  counts = np.zeros((len(image_list), 4), dtype=np.int64)
+  directory_predictions = path_dir + "predictions\\" + model_name
+  if not os.path.exists(directory_predictions):
+      os.makedirs(directory_predictions)
+  with AsyncWriter(write_fn=profiler.wrap("write", cv.imwrite, model_name)) as writer:
+    for i, image_name in enumerate(image_list):
+      start_time = time.time()
+      with profiler.span("decode", model=model_name, image=image_name):
+        ori_x = cv.imread(path_image_dir+image_name, cv.IMREAD_COLOR)
+      with profiler.span("forward", model=model_name, image=image_name):
+        pred_mask = prediction_to_mask(predict_tiled(predict_fn, ori_x, IMAGE_SIZE, tile_overlap, batch_size,
+                                                 registry.normalize_fn(model_name)), registry.threshold(model_name))
+      print(str(model_name) + "-" + str(i) + " - Tiled prediction time: " + str(time.time() - start_time) + "s")
+      writer.write(path_dir + "predictions\\" + model_name + "\\" + image_name, pred_mask)
+      with profiler.span("metrics", model=model_name, image=image_name):
+        counts[i] = confusion_matrix(pred_mask, load_ground_truth(path_masks_dir+image_name, None))
+  return metrics_from_counts(counts)
+
+
+def segment_ensemble(fusion):
+  #Load all the models (the ones still in the pool are not loaded again)
+  members = {}
+  for model_name in registry.names():
+    predict_fn, image_size, load_time = model_pool.get(model_name)
+    print(str(model_name) + " model - Load time: " + str(load_time) + "s")
+    members[model_name] = (predict_fn, image_size)
+  latency_budget = ensemble_latency_budget_ms/1000 if ensemble_latency_budget_ms is not None else None
+  ensemble = Ensemble(members, fusion, ensemble_weights, latency_budget=latency_budget,
+                      thresholds={model_name: registry.threshold(model_name) for model_name in members},
+                      normalize_fns={model_name: registry.normalize_fn(model_name) for model_name in members})
+  print("Time per image of each model: " + str(ensemble.warmup(batch_size)))
+
+  #Every image is decoded once and shared by all the models
+  IMAGE_SIZE = ensemble.output_size
+  ensemble_name = "ensemble_" + fusion
+  pred_masks = np.zeros((len(image_list), IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+  gt_masks = np.zeros((len(image_list), IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+  directory_predictions = path_dir + "predictions\\" + ensemble_name
+  if not os.path.exists(directory_predictions):
+      os.makedirs(directory_predictions)
+  with ThreadPoolExecutor(max_workers=num_workers) as pool, AsyncWriter() as writer:
+    for start in range(0, len(image_list), batch_size):
+      batch_names = image_list[start:start+batch_size]
+      decoded = list(pool.map(lambda image_name: read_multi_size(path_image_dir+image_name, ensemble.image_sizes), batch_names))
+      images = {image_size: np.stack([d[image_size] for d in decoded]) for image_size in ensemble.image_sizes}
+      start_time = time.time()
+      with profiler.span("forward", model=ensemble_name):
+        pred_masks[start:start+len(batch_names)], used_models = ensemble.predict(images)
+      print(ensemble_name + "-" + str(start) + ":" + str(start+len(batch_names)-1) + " - Batch prediction time: " + str(time.time() - start_time) + "s (" + ", ".join(used_models) + ")")
+      for i, image_name in enumerate(batch_names, start):
+        writer.write(path_dir + "predictions\\" + ensemble_name + "\\" + image_name, pred_masks[i])
+        gt_masks[i] = read_mask(path_masks_dir+image_name, IMAGE_SIZE)
+  return segmentation_metrics(pred_masks, gt_masks)
+
+
+if __name__ == "__main__":
+  if parallel_models > 0:
+    #One model per worker process, inputs decoded once and shared between them
+    models = {model_name: (registry.path(model_name), registry.image_size(model_name), registry.threshold(model_name),
+                           registry.normalize_fn(model_name)) for model_name in registry.names()}
+    metrics = run_sweep(models, [path_image_dir+image_name for image_name in image_list],
+                        [path_masks_dir+image_name for image_name in image_list], image_list, path_dir + "predictions",
+                        batch_size=batch_size, processes=parallel_models, intra_op_threads=intra_op_threads,
+                        inter_op_threads=inter_op_threads, num_workers=num_workers, cache=input_cache,
+                        inference_mode=inference_mode, tflite_quantization=tflite_quantization, use_gpu=parallel_models_gpu)
+  else:
+    for model_name in registry.names():
+      metrics[model_name] = segment_model(model_name)
+  if ensemble_fusion is not None:
+    metrics["ensemble_" + ensemble_fusion] = segment_ensemble(ensemble_fusion)
+
+  #Results models
+  for model_name in metrics:
+    metrics_avg[model_name] = {}
     for metric_i in metrics[model_name]:
-        print('\t- ' + metric_i + ': ' + str(metrics_avg[model_name][metric_i])+'\n')
-    print("---------------------------")
\ No newline at end of file
+      metrics_avg[model_name][metric_i] = float(np.mean(metrics[model_name][metric_i]))
+
+  #Print results summary
+  for model_name in metrics:
+      print(model_name + ":")
+      for metric_i in metrics[model_name]:
+          print('\t- ' + metric_i + ': ' + str(metrics_avg[model_name][metric_i])+'\n')
+      print("---------------------------")
+  if incremental:
+    write_result_coefficients(path_dir + "result_coefficients.txt", metrics_avg)
+  if parallel_models == 0:
+    print("Models (load time and memory):")
+    model_pool.print_stats()
+  if profiling:
+    profiler.print_slowest()
+    profiler.export(path_dir + "profile\\trace.json", path_dir + "profile\\summary.json")
+    print("Profile saved in " + path_dir + "profile\\ (open trace.json in chrome://tracing or https://ui.perfetto.dev)")
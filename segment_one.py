@@ -1,77 +1,145 @@
+import time
+start_process_time = time.time()
 import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
-import tensorflow as tf
+import sys
+import argparse
 import numpy as np
 import cv2 as cv
-import time
 import glob
+from segmentation.metrics import confusion_matrix
+from segmentation.postprocess import prediction_to_mask
+from segmentation.warm_model import serve, request_segmentation, shutdown, pool_stats
+from segmentation.registry import ModelRegistry, WarmPool, model_bytes
+from segmentation.profiling import Profiler
+from segmentation.instances import extract_instances, draw_instances
 
 #User selections
 images_folder = "real_images"
 image_name = "20231108_143246_7.jpg"
 model_name = 'unet'
+inference_mode = "graph" #"graph": traced tf.function with warm-up, "keras": model.predict, "tflite": quantized TFLite model
+tflite_quantization = "float16" #TFLite model exported with export_tflite.py ("float16", "int8" or "dynamic")
+use_warm_process = True #Send the request to the warm model process if it is running (python segment_one.py --serve)
+instance_extraction = False #Extract the cable instances and their centerline polylines from the predicted mask
+model_pool_mb = 4096 #Memory limit of the weights of the models kept loaded by the warm model process
+profiling = False #Save a Chrome trace of the stages in <images_folder>\profile\
+
+#Command line arguments (optional, they override the user selections)
+parser = argparse.ArgumentParser(description="Segments a single image with one of the trained models")
+parser.add_argument("image_name", nargs="?", default=image_name)
+parser.add_argument("--model", default=model_name, help="Model name")
+parser.add_argument("--folder", default=images_folder, help="Images folder")
+parser.add_argument("--serve", action="store_true", help="Start a warm model process that keeps the models loaded")
+parser.add_argument("--shutdown", action="store_true", help="Stop the warm model process")
+parser.add_argument("--stats", action="store_true", help="Print the load time and memory of the models of the warm model process")
+parser.add_argument("--cold", action="store_true", help="Do not use the warm model process")
+parser.add_argument("--no-display", action="store_true", help="Do not show the images")
+parser.add_argument("--instances", action="store_true", help="Extract the cable instances and their centerlines")
+parser.add_argument("--profile", action="store_true", help="Save a Chrome trace of the stages")
+parser.add_argument("--tf-trace", action="store_true", help="Also capture a TensorFlow profiler trace of the prediction (with --profile)")
+args = parser.parse_args()
+image_name = args.image_name
+model_name = args.model
+images_folder = args.folder
 
 #Initialization of variables
-model_list = {'unet':512, 'deeplabv3p':512, 'fcn':512, 'fpn':512,'linknet':512, 'pspnet':480} #Model names and img sizes
 metrics = {'TP':[], 'FP':[], 'TN':[], 'FN':[], 'IoU':[], 'Dice':[]}
 path_dir = os.path.dirname(os.path.realpath(__file__)) + "\\"+images_folder+"\\"
 path_image = path_dir + "images\\"+image_name
 path_mask = path_dir + "masks\\"+image_name
+path_models_dir = os.path.dirname(os.path.realpath(__file__)) + "\\models\\"
+registry = ModelRegistry(path_models_dir) #Input size, normalization and threshold of every model
+profiling = profiling or args.profile
+instance_extraction = instance_extraction or args.instances
+profiler = Profiler(profiling, tf_trace_dir=path_dir + "profile\\tf_trace" if args.tf_trace else None)
+
+
+def load_model(model_name):
+    """
+    Loads a model for inference only: TensorFlow is imported on first use and the model is not compiled
+    """
+    start_time = time.time()
+    with profiler.span("import"):
+        import tensorflow #Imported here to time it separately from the model loading
+    print("Import time: " + str(time.time() - start_time) + "s")
+
+    IMAGE_SIZE = registry.image_size(model_name)
+    print("Loading: " + str(model_name) + " model...")
+    start_time = time.time()
+    with profiler.span("load", model=model_name):
+        predict_fn = registry.load(model_name, inference_mode, tflite_quantization)
+    print("Load and warm-up time: " + str(time.time() - start_time) + "s - Weights: " + str(model_bytes(predict_fn)/1024**2) + " MB")
+    return predict_fn, IMAGE_SIZE
+
+
+if args.serve:
+    #The models are loaded on demand and the least recently used ones are released above model_pool_mb
+    pool = WarmPool(registry, model_pool_mb, inference_mode, tflite_quantization)
+    serve(pool, preload=[model_name])
+    sys.exit(0)
+if args.shutdown:
+    shutdown()
+    sys.exit(0)
+if args.stats:
+    stats = pool_stats()
+    if stats is None:
+        print("The warm model process is not running")
+    for name in (stats or {}):
+        print("- " + name + ": " + str(stats[name]))
+    sys.exit(0)
+
+IMAGE_SIZE = registry.image_size(model_name)
+
+#Predict with the warm model process if it is running, otherwise load the model in this process
+response = None
+if use_warm_process and not args.cold:
+    start_time = time.time()
+    with profiler.span("warm_request", model=model_name, image=image_name):
+        response = request_segmentation(model_name, path_image)
+if response is not None:
+    pred_mask = response['mask']
+    print("Warm start - Request time: " + str(time.time() - start_time) + "s (model load: " + str(response['load_time']) + "s, prediction: " + str(response['predict_time']) + "s)\n")
+else:
+    predict_fn, IMAGE_SIZE = load_model(model_name)
+    print("Cold start - Time to model ready: " + str(time.time() - start_process_time) + "s")
+
+    #Load image
+    with profiler.span("decode", model=model_name, image=image_name):
+        ori_x = cv.imread(path_image, cv.IMREAD_COLOR)
+        ori_x = cv.resize(ori_x, (IMAGE_SIZE, IMAGE_SIZE))
+        x = registry.normalize(model_name, ori_x)
+        x = np.expand_dims(x, axis=0)
 
+    #Predict
+    start_time = time.time()
+    with profiler.tf_trace(), profiler.span("forward", model=model_name, image=image_name):
+        pred = predict_fn(x)[0]
+    with profiler.span("postprocess", model=model_name, image=image_name):
+        pred_mask = prediction_to_mask(pred, registry.threshold(model_name))
+    print("Prediction time: " + str(time.time() - start_time) + "s \n")
 
-def compare_masks(mask1, mask2):
-    # Convert masks to numpy arrays
-    mask1 = np.array(mask1, dtype=np.uint8)
-    mask2 = np.array(mask2, dtype=np.uint8)
-
-    # Convert masks to binary (0 and 1)
-    mask1 = mask1 > 0
-    mask2 = mask2 > 0
-
-    true_positives = np.count_nonzero(np.logical_and(mask1, mask2))
-    false_positives = np.count_nonzero(np.logical_and(mask1, np.logical_not(mask2)))
-    false_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), mask2))
-    true_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), np.logical_not(mask2)))
-
-    return true_positives, false_positives, false_negatives, true_negatives
-
-
-#Load the model
-IMAGE_SIZE = model_list[model_name]
-path_model = os.path.dirname(os.path.realpath(__file__)) + "\\models\\"+model_name
-print("Loading: " + str(model_name) + " model...")
-model = tf.keras.models.load_model(path_model, compile=False)
-model.compile(optimizer='adam',
-            loss=tf.keras.losses.BinaryCrossentropy(),
-            metrics=[tf.keras.metrics.FalseNegatives()])
-
-#Load image
-ori_x = cv.imread(path_image, cv.IMREAD_COLOR)
-ori_x = cv.resize(ori_x, (IMAGE_SIZE, IMAGE_SIZE))
-x = ori_x/255.0
-x = x.astype(np.float32)
-x = np.expand_dims(x, axis=0)
-cv.imshow("Image", ori_x)
-
-#Predict and save result
-start_time = time.time()
-pred_mask = model.predict(x)[0] > 0.5
-prediction_image = tf.keras.preprocessing.image.array_to_img(pred_mask)
-prediction_image2 = tf.keras.preprocessing.image.img_to_array(prediction_image)
-pred_image_cv2 = cv.cvtColor(prediction_image2.astype('uint8'), cv.COLOR_RGB2BGR)
-print("Prediction time: " + str(time.time() - start_time) + "s \n")
-cv.imshow("Prediction", pred_image_cv2)
+#Cable instances and centerlines (works also with the mask of the warm model process)
+instances = None
+if instance_extraction:
+    start_time = time.time()
+    with profiler.span("instances", model=model_name, image=image_name):
+        instances = extract_instances(pred_mask)
+    print("Instance extraction time: " + str(time.time() - start_time) + "s - " + str(len(instances)) + " cables")
+    for instance in instances:
+        print("\t- Cable " + str(instance['id']) + ": area " + str(instance['area']) + " px, length " + str(instance['length']) + " px, " + str(len(instance['polylines'])) + " centerline polylines")
+    print("")
 
 #Compare prediction with ground truth
-image_gray_segmented = cv.cvtColor(pred_image_cv2, cv.COLOR_BGR2GRAY)
-mask_ground_truth = cv.imread(path_mask, cv.IMREAD_GRAYSCALE)
-if mask_ground_truth.shape[0] != IMAGE_SIZE:
-    mask_ground_truth = cv.resize(mask_ground_truth, (IMAGE_SIZE, IMAGE_SIZE))
-_, binary_image_GT = cv.threshold(mask_ground_truth, 60, 255, cv.THRESH_BINARY)
-cv.imshow("Ground truth", binary_image_GT)
+with profiler.span("ground_truth", model=model_name, image=image_name):
+    mask_ground_truth = cv.imread(path_mask, cv.IMREAD_GRAYSCALE)
+    if mask_ground_truth.shape[0] != IMAGE_SIZE:
+        mask_ground_truth = cv.resize(mask_ground_truth, (IMAGE_SIZE, IMAGE_SIZE))
+    _, binary_image_GT = cv.threshold(mask_ground_truth, 60, 255, cv.THRESH_BINARY)
 
 #Get metrics
-tp_i, fp_i, fn_i, tn_i = compare_masks(image_gray_segmented, binary_image_GT)
+with profiler.span("metrics", model=model_name, image=image_name):
+    tp_i, fp_i, fn_i, tn_i = (int(n) for n in confusion_matrix(pred_mask, binary_image_GT))
 metrics['TP'].append(tp_i)
 metrics['FP'].append(fp_i)
 metrics['FN'].append(fn_i)
@@ -82,5 +150,15 @@ metrics['Dice'].append((2*tp_i)/((2*tp_i)+fp_i+fn_i))
 #Print results summary
 for metric_i in metrics:
     print('- ' + metric_i + ': ' + str(metrics[metric_i])+'\n')
+print("Total time: " + str(time.time() - start_process_time) + "s")
+if profiling:
+    profiler.print_slowest()
+    profiler.export(path_dir + "profile\\segment_one_trace.json", path_dir + "profile\\segment_one_summary.json")
 
-cv.waitKey(0)
\ No newline at end of file
+if not args.no_display:
+    cv.imshow("Image", cv.resize(cv.imread(path_image, cv.IMREAD_COLOR), (IMAGE_SIZE, IMAGE_SIZE)))
+    cv.imshow("Prediction", pred_mask)
+    if instances is not None:
+        cv.imshow("Instances", draw_instances(pred_mask, instances))
+    cv.imshow("Ground truth", binary_image_GT)
+    cv.waitKey(0)
@@ -0,0 +1,81 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+import numpy as np
+import time
+from segmentation.engine import AsyncWriter
+from segmentation.streaming import iter_directory, iter_video, stream_segment, directory_masks
+from segmentation.instances import extract_instances
+from segmentation.registry import ModelRegistry
+
+#User selections
+source = "real_images\\images" #Folder with the frames, or video file
+watch = False #Keep waiting for new frames in the folder
+masks_folder = "real_images\\masks" #Optional ground truth masks with the same name as the frames (None: no metrics)
+output_folder = "stream_predictions"
+model_name = 'unet'
+inference_mode = "graph" #"graph": traced tf.function with warm-up, "keras": model.predict, "tflite": quantized TFLite model
+tflite_quantization = "float16" #TFLite model exported with export_tflite.py ("float16", "int8" or "dynamic")
+batch_size = 4 #Maximum number of frames predicted at once
+prefetch = 8 #Maximum number of frames read ahead of the model
+instance_extraction = False #Extract the cable instances and their centerlines of every frame (the time is printed next to the latency)
+
+#Initialization of variables
+path_root = os.path.dirname(os.path.realpath(__file__)) + "\\"
+registry = ModelRegistry(path_root + "models\\") #Input size, normalization and threshold of every model
+path_source = path_root + source
+path_output = path_root + output_folder + "\\" + model_name
+if not os.path.exists(path_output):
+    os.makedirs(path_output)
+
+#Load the model
+IMAGE_SIZE = registry.image_size(model_name)
+print("Loading: " + str(model_name) + " model...")
+predict_fn = registry.load(model_name, inference_mode, tflite_quantization, warmup_batch_size=batch_size)
+if getattr(predict_fn, "warmup_time", None) is not None:
+    print("Warm-up time: " + str(predict_fn.warmup_time) + "s")
+
+#Frame source
+if os.path.isdir(path_source):
+    frames = iter_directory(path_source, watch=watch)
+else:
+    frames = ((str(index) + ".png", frame) for index, frame in iter_video(path_source))
+mask_fn = directory_masks(path_root + masks_folder) if masks_folder is not None else None
+
+#Segment the stream. Only running sums are kept, so memory does not grow with the number of frames
+totals = np.zeros(4, dtype=np.int64)
+n_frames = 0
+n_evaluated = 0
+sum_iou = 0.0
+sum_dice = 0.0
+start_time = time.time()
+with AsyncWriter() as writer:
+    for result in stream_segment(predict_fn, frames, IMAGE_SIZE, batch_size=batch_size, prefetch=prefetch,
+                                 threshold=registry.threshold(model_name), mask_fn=mask_fn, restore_size=True,
+                                 normalize_fn=registry.normalize_fn(model_name)):
+        writer.write(os.path.join(path_output, str(result.frame_id)), result.mask)
+        n_frames += 1
+        message = str(result.frame_id) + " - Latency: " + str(result.latency) + "s"
+        if instance_extraction:
+            instances_start = time.time()
+            instances = extract_instances(result.mask)
+            message += " - Instance extraction time: " + str(time.time() - instances_start) + "s (" + str(len(instances)) + " cables)"
+        if result.counts is not None:
+            tp_i, fp_i, fn_i, tn_i = (int(n) for n in result.counts)
+            totals += result.counts
+            n_evaluated += 1
+            iou_i = tp_i/(tp_i+fp_i+fn_i) if tp_i+fp_i+fn_i > 0 else 1.0
+            sum_iou += iou_i
+            sum_dice += (2*tp_i)/((2*tp_i)+fp_i+fn_i) if tp_i+fp_i+fn_i > 0 else 1.0
+            message += " - IoU: " + str(iou_i)
+        print(message)
+
+#Print results summary
+total_time = time.time() - start_time
+print("Frames: " + str(n_frames) + " - Throughput: " + str(n_frames/total_time if total_time > 0 else 0.0) + " frames/s")
+if n_evaluated > 0:
+    print("- TP: " + str(totals[0]/n_evaluated) + '\n')
+    print("- FP: " + str(totals[1]/n_evaluated) + '\n')
+    print("- FN: " + str(totals[2]/n_evaluated) + '\n')
+    print("- TN: " + str(totals[3]/n_evaluated) + '\n')
+    print("- IoU: " + str(sum_iou/n_evaluated) + '\n')
+    print("- Dice: " + str(sum_dice/n_evaluated) + '\n')
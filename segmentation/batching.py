@@ -0,0 +1,135 @@
+import time
+import queue
+import threading
+import collections
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+from segmentation.benchmark import summarize
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a request is rejected because the queue of the model is full (backpressure)
+    """
+
+
+class BatcherClosedError(Exception):
+    """
+    Raised for the requests submitted to a closed batcher, or still queued when it was closed
+    """
+
+
+class DynamicBatcher:
+    """
+    Collects concurrent requests for one model into dynamic batches. A batch is run as soon as it has max_batch_size
+    inputs or its first input has waited max_wait seconds. At most max_queue inputs can be waiting; beyond that,
+    submit() raises QueueFullError so that the caller can reject the request.
+    """
+    def __init__(self, predict_fn, max_batch_size=8, max_wait=0.005, max_queue=64, history=1000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._n_requests = 0
+        self._n_rejected = 0
+        self._n_batches = 0
+        self._queue_times = collections.deque(maxlen=history)
+        self._inference_times = collections.deque(maxlen=history)
+        self._batch_sizes = collections.deque(maxlen=history)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, x):
+        """
+        Queues one preprocessed input (S, S, 3). Returns a Future with (prediction, queue_time, inference_time)
+        """
+        future = Future()
+        with self._lock:
+            if self._stop.is_set():
+                raise BatcherClosedError("The batcher is closed")
+            try:
+                self._queue.put_nowait((x, time.time(), future))
+            except queue.Full:
+                self._n_rejected += 1
+                raise QueueFullError("Too many pending requests")
+        return future
+
+    def predict(self, x, timeout=None):
+        """
+        Predicts one input, raising concurrent.futures.TimeoutError after timeout seconds (the request is then
+        dropped if it has not started)
+        """
+        future = self.submit(x)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        """
+        Stops the batching thread after its current batch. The requests still queued fail with BatcherClosedError
+        """
+        with self._lock:
+            self._stop.set()
+        self._thread.join()
+        while True:
+            try:
+                _, _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(BatcherClosedError("The batcher was closed before the request was predicted"))
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.time() - self._start_time
+            return {'requests': self._n_requests, 'rejected': self._n_rejected, 'batches': self._n_batches,
+                    'pending': self._queue.qsize(), 'throughput_rps': self._n_requests / elapsed if elapsed > 0 else 0.0,
+                    'mean_batch_size': float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+                    'queue_latency': summarize(list(self._queue_times)),
+                    'inference_latency': summarize(list(self._inference_times))}
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        items = [first]
+        deadline = first[1] + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stop.is_set():
+            #Requests cancelled by predict() after a timeout are dropped
+            items = [item for item in self._next_batch() if item[2].set_running_or_notify_cancel()]
+            if not items:
+                continue
+            start_time = time.time()
+            try:
+                preds = self.predict_fn(np.stack([x for x, _, _ in items]))
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+            inference_time = time.time() - start_time
+            with self._lock:
+                self._n_requests += len(items)
+                self._n_batches += 1
+                self._batch_sizes.append(len(items))
+                self._inference_times.append(inference_time)
+                for _, enqueue_time, _ in items:
+                    self._queue_times.append(start_time - enqueue_time)
+            for (_, enqueue_time, future), pred in zip(items, preds):
+                future.set_result((pred, start_time - enqueue_time, inference_time))
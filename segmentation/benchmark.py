@@ -0,0 +1,100 @@
+import sys
+import time
+import json
+import platform
+import contextlib
+import collections
+
+import numpy as np
+
+
+class StageTimer:
+    """
+    Records the duration of every run of each named stage, e.g.:
+        with timer.stage("decode"):
+            image = cv.imread(path)
+    """
+    def __init__(self):
+        self.durations = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def add(self, name, duration):
+        self.durations.setdefault(name, []).append(duration)
+
+    def summary(self):
+        return collections.OrderedDict((name, summarize(values)) for name, values in self.durations.items())
+
+
+def summarize(durations):
+    """
+    Latency statistics (in ms) of a list of durations in seconds
+    """
+    values = np.asarray(durations, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {'n': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'n': int(values.size), 'mean_ms': float(values.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95),
+            'p99_ms': float(p99), 'max_ms': float(values.max())}
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the current process in MB (None if it cannot be measured on this platform)
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024 #Bytes on macOS, KB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss) / 1024**2
+    except ImportError:
+        return None
+
+
+def environment_info():
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'numpy': np.__version__}
+    for module_name in ("tensorflow", "cv2"):
+        module = sys.modules.get(module_name)
+        if module is not None:
+            info[module_name] = getattr(module, "__version__", None)
+    return info
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, statistic="p50_ms"):
+    """
+    Ratio current/baseline of a latency statistic for every model, dataset and stage present in both results
+    (> 1 means slower than the baseline)
+    """
+    ratios = {}
+    for model_name, datasets in current['results'].items():
+        for dataset, result in datasets.items():
+            baseline_result = baseline['results'].get(model_name, {}).get(dataset)
+            if baseline_result is None:
+                continue
+            for stage, stats in result['stages'].items():
+                baseline_stats = baseline_result['stages'].get(stage)
+                if baseline_stats and baseline_stats.get(statistic) and statistic in stats:
+                    ratios[(model_name, dataset, stage)] = stats[statistic] / baseline_stats[statistic]
+    return ratios
@@ -0,0 +1,110 @@
+import os
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+from segmentation.engine import read_resized, load_ground_truth
+
+
+class InputCache:
+    """
+    Persistent on-disk cache of preprocessed inputs: resized images (uint8) and binarized ground truth masks.
+    Every entry is an .npy file keyed by the source file path, its modification time and size, and the target
+    image size, so it is invalidated when the source file changes. Entries are read back memory-mapped.
+    When the cache grows beyond max_bytes, the least recently used entries are deleted.
+    """
+    def __init__(self, cache_dir, max_bytes=2*1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        #Index of the existing entries: file name -> [size in bytes, last use]
+        self._entries = {}
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(".npy"):
+                stat = os.stat(os.path.join(cache_dir, file_name))
+                self._entries[file_name] = [stat.st_size, stat.st_mtime]
+        self._total_bytes = sum(entry[0] for entry in self._entries.values())
+
+    def get_image(self, path, image_size):
+        """
+        Returns the image resized to image_size (uint8, BGR)
+        """
+        return self._get("image", path, image_size, read_resized)
+
+    def get_mask(self, path, image_size):
+        """
+        Returns the ground truth mask resized to image_size and binarized (0/255)
+        """
+        return self._get("mask", path, image_size, load_ground_truth)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            for file_name in list(self._entries):
+                self._remove(file_name)
+
+    def _key(self, kind, path, image_size):
+        stat = os.stat(path)
+        key = "|".join([kind, os.path.abspath(path), str(stat.st_mtime_ns), str(stat.st_size), str(image_size)])
+        return kind + "_" + str(image_size) + "_" + hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy"
+
+    def _get(self, kind, path, image_size, load_fn):
+        file_name = self._key(kind, path, image_size)
+        cache_path = os.path.join(self.cache_dir, file_name)
+        with self._lock:
+            cached = file_name in self._entries
+        if cached:
+            try:
+                array = np.load(cache_path, mmap_mode='r')
+            except (OSError, ValueError):
+                array = None #Deleted by another process or partially written, it is computed again
+            if array is not None:
+                with self._lock:
+                    self.hits += 1
+                    if file_name in self._entries:
+                        self._entries[file_name][1] = time.time()
+                try:
+                    os.utime(cache_path) #Keep the last use across runs
+                except OSError:
+                    pass
+                return array
+
+        array = load_fn(path, image_size)
+        tmp_path = cache_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, cache_path)
+        with self._lock:
+            self.misses += 1
+            if file_name in self._entries:
+                self._total_bytes -= self._entries[file_name][0]
+            size = os.path.getsize(cache_path)
+            self._entries[file_name] = [size, time.time()]
+            self._total_bytes += size
+            self._evict()
+        return array
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for file_name in sorted(self._entries, key=lambda name: self._entries[name][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(file_name)
+
+    def _remove(self, file_name):
+        size, _ = self._entries.pop(file_name)
+        self._total_bytes -= size
+        try:
+            os.remove(os.path.join(self.cache_dir, file_name))
+        except OSError:
+            pass
@@ -0,0 +1,105 @@
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from segmentation.metrics import confusion_matrix, metrics_from_counts
+from segmentation.postprocess import prediction_to_mask
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def find_categories(root_dir, folders=("real_images", "synthetic_images")):
+    """
+    Finds the evaluation categories below root_dir: every folder with images/ and masks/ subfolders.
+    Returns {category: (images_dir, masks_dir)}, with the category named by its relative path using "/"
+    (e.g. "real_images", "synthetic_images/far")
+    """
+    categories = {}
+    for folder in folders:
+        for dir_path, dir_names, _ in os.walk(os.path.join(root_dir, folder)):
+            dir_names.sort()
+            if "images" in dir_names and "masks" in dir_names:
+                category = os.path.relpath(dir_path, root_dir).replace(os.sep, "/")
+                categories[category] = (os.path.join(dir_path, "images"), os.path.join(dir_path, "masks"))
+                dir_names[:] = [d for d in dir_names if d not in ("images", "masks", "predictions")]
+    return categories
+
+
+def list_pairs(categories):
+    """
+    Pairs every image with the mask with the same name. Returns (image_paths, mask_paths, category_ids, category_names)
+    """
+    image_paths, mask_paths, category_ids = [], [], []
+    category_names = list(categories)
+    for category_id, category in enumerate(category_names):
+        images_dir, masks_dir = categories[category]
+        for image_name in sorted(os.listdir(images_dir)):
+            if not image_name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(os.path.join(masks_dir, image_name)):
+                continue
+            image_paths.append(os.path.join(images_dir, image_name))
+            mask_paths.append(os.path.join(masks_dir, image_name))
+            category_ids.append(category_id)
+    return image_paths, mask_paths, np.asarray(category_ids, dtype=np.int32), category_names
+
+
+def _read_pair(image_path, mask_path, image_size):
+    #Same preprocessing as engine.read_resized and engine.load_ground_truth: BGR image, bilinear resize, mask > 60
+    image = tf.io.decode_image(tf.io.read_file(image_path), channels=3, expand_animations=False)
+    image = tf.reverse(image, axis=[-1])
+    image = tf.image.resize(image, (image_size, image_size), method="bilinear")
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    mask = tf.io.decode_image(tf.io.read_file(mask_path), channels=1, expand_animations=False)
+    mask = tf.image.resize(mask, (image_size, image_size), method="bilinear")
+    mask = tf.cast(mask[..., 0] > 60, tf.uint8)
+    return image, mask
+
+
+def evaluation_dataset(image_paths, mask_paths, category_ids, image_size, batch_size=8, cache=None,
+                       num_parallel_calls=tf.data.AUTOTUNE, normalize_fn=None):
+    """
+    tf.data pipeline of (image batch, mask batch, category id batch). Images are decoded and resized in parallel,
+    optionally cached (cache="" in memory, or a file prefix to cache on disk) as uint8, then normalized, batched
+    and prefetched while the model predicts the previous batch.
+    normalize_fn: normalization of the model (uint8 batch -> float32 batch, e.g. ModelRegistry.normalize), None: / 255
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((image_paths, mask_paths, category_ids))
+    dataset = dataset.map(lambda image_path, mask_path, category_id: _read_pair(image_path, mask_path, image_size) + (category_id,),
+                          num_parallel_calls=num_parallel_calls, deterministic=True)
+    if cache is not None:
+        dataset = dataset.cache(cache)
+    dataset = dataset.batch(batch_size)
+    if normalize_fn is None:
+        dataset = dataset.map(lambda images, masks, ids: (tf.cast(images, tf.float32) / 255.0, masks, ids),
+                              num_parallel_calls=num_parallel_calls)
+    else:
+        dataset = dataset.map(lambda images, masks, ids: (tf.numpy_function(lambda x: np.asarray(normalize_fn(x), dtype=np.float32), [images], tf.float32), masks, ids),
+                              num_parallel_calls=num_parallel_calls)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def evaluate_categories(predict_fn, dataset, category_names, threshold=0.5, verbose=True):
+    """
+    Predicts every batch of the dataset and accumulates the [TP, FP, FN, TN] counts of every image.
+    Returns ({category: metrics of its images}, counts, category_ids), with the metrics of metrics_from_counts
+    and an extra "all" category with every image
+    """
+    counts = []
+    category_ids = []
+    for i, (images, masks, ids) in enumerate(dataset):
+        start_time = time.time()
+        preds = predict_fn(images.numpy())
+        predict_time = time.time() - start_time
+        pred_masks = prediction_to_mask(np.asarray(preds), threshold)
+        counts.append(confusion_matrix(pred_masks, masks.numpy()))
+        category_ids.append(ids.numpy())
+        if verbose:
+            print("Batch " + str(i) + " - Batch prediction time: " + str(predict_time) + "s")
+    counts = np.concatenate(counts) if counts else np.zeros((0, 4), dtype=np.int64)
+    category_ids = np.concatenate(category_ids) if category_ids else np.zeros(0, dtype=np.int32)
+    metrics = {}
+    for category_id, category in enumerate(category_names):
+        metrics[category] = metrics_from_counts(counts[category_ids == category_id])
+    metrics["all"] = metrics_from_counts(counts)
+    return metrics, counts, category_ids
@@ -0,0 +1,225 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2 as cv
+
+
+def read_resized(path, image_size):
+    """
+    Reads a color image and resizes it to the model input size (uint8)
+    """
+    ori_x = cv.imread(path, cv.IMREAD_COLOR)
+    if ori_x is None:
+        raise IOError("Could not read image: " + str(path))
+    return cv.resize(ori_x, (image_size, image_size))
+
+
+def normalize(images):
+    """
+    Normalizes uint8 images to float32 in [0, 1], as expected by the models
+    """
+    x = images/255.0
+    return x.astype(np.float32)
+
+
+def load_image(path, image_size):
+    """
+    Reads an image, resizes it to the model input size and normalizes it to [0, 1]
+    """
+    return normalize(read_resized(path, image_size))
+
+
+def load_ground_truth(path, image_size):
+    """
+    Reads a ground truth mask, resizes it to the model input size if needed and binarizes it (0/255).
+    With image_size=None the mask is kept at its native resolution.
+    """
+    mask_ground_truth = cv.imread(path, cv.IMREAD_GRAYSCALE)
+    if mask_ground_truth is None:
+        raise IOError("Could not read mask: " + str(path))
+    if image_size is not None and mask_ground_truth.shape[0] != image_size:
+        mask_ground_truth = cv.resize(mask_ground_truth, (image_size, image_size))
+    _, binary_image_GT = cv.threshold(mask_ground_truth, 60, 255, cv.THRESH_BINARY)
+    return binary_image_GT
+
+
+class BackgroundProducer:
+    """
+    Runs produce() (a function returning an iterator) in a background thread and keeps up to maxsize of its items
+    in a bounded queue, so that memory does not grow when the consumer is slower. get() returns the next item
+    (BackgroundProducer.end after the last one) and re-raises the errors of the producer. close() stops the
+    producer, also when it is waiting on a full queue.
+    """
+    end = object()
+
+    def __init__(self, produce, maxsize=2):
+        self._produce = produce
+        self._queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get(self, timeout=None):
+        item = self._queue.get(timeout=timeout)
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is self.end:
+                return
+            yield item
+
+    def close(self):
+        self._stop.set()
+        #Unblock the producer if it is waiting on a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(timeout=0.1)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        items = None
+        try:
+            items = self._produce()
+            for item in items:
+                if not self._put(item):
+                    return
+            self._put(self.end)
+        except BaseException as e:
+            self._put(e)
+        finally:
+            if hasattr(items, "close"):
+                items.close() #Runs the cleanup of a generator stopped early
+
+
+class BatchLoader:
+    """
+    Loader stage: decodes and resizes the images in a thread pool and stacks them into float32 batches.
+    Up to 'prefetch' batches are prepared in the background while the model runs on the current one.
+    Iterating over it yields (paths, batch) tuples in the same order as the input paths.
+    read_fn(path, image_size) returns the resized uint8 image (e.g. InputCache.get_image), by default read_resized.
+    normalize_fn(images) is the normalization of the model (e.g. ModelRegistry.normalize_fn), by default normalize.
+    """
+    def __init__(self, paths, image_size, batch_size=8, num_workers=4, prefetch=2, read_fn=None, normalize_fn=None):
+        self.paths = list(paths)
+        self.image_size = image_size
+        self.read_fn = read_fn or read_resized
+        self.normalize_fn = normalize_fn or normalize
+        self.batch_size = max(1, int(batch_size))
+        self.num_workers = max(1, int(num_workers))
+        self.prefetch = prefetch
+        self._producer = None
+
+    def __iter__(self):
+        self._producer = BackgroundProducer(self._batches, self.prefetch)
+        try:
+            for item in self._producer:
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        if self._producer is not None:
+            self._producer.close()
+            self._producer = None
+
+    def _batches(self):
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            for start in range(0, len(self.paths), self.batch_size):
+                batch_paths = self.paths[start:start+self.batch_size]
+                images = list(pool.map(lambda p: self.normalize_fn(self.read_fn(p, self.image_size)), batch_paths))
+                yield batch_paths, np.stack(images)
+
+
+class AsyncWriter:
+    """
+    Writer stage: saves the images with cv.imwrite in a background thread, so that writing overlaps with the model computation.
+    Errors raised while writing are re-raised on close(). write_fn(path, image) replaces cv.imwrite (e.g. to profile it).
+    """
+    _end = object()
+
+    def __init__(self, max_pending=32, write_fn=None):
+        self.write_fn = write_fn if write_fn is not None else cv.imwrite
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._error = None
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def write(self, path, image):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((path, image))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(self._end)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _consume(self):
+        while True:
+            item = self._queue.get()
+            if item is self._end:
+                return
+            if self._error is not None:
+                continue #Drain the queue after an error so write() never blocks
+            path, image = item
+            try:
+                if not self.write_fn(path, image):
+                    raise IOError("Could not write image: " + str(path))
+            except BaseException as e:
+                self._error = e
+
+
+class InferenceEngine:
+    """
+    Batched and pipelined inference: the loader stage, the model and the writer stage run concurrently.
+    predict_fn receives a float32 batch of shape (N, image_size, image_size, 3) and returns the N predictions.
+    """
+    def __init__(self, predict_fn, image_size, batch_size=8, num_workers=4, prefetch=2, read_fn=None, normalize_fn=None):
+        self.predict_fn = predict_fn
+        self.image_size = image_size
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+        self.read_fn = read_fn
+        self.normalize_fn = normalize_fn
+        self.last_predict_time = 0.0
+        self.last_predict_start = None
+
+    def run(self, paths):
+        """
+        Yields (paths, predictions) for every batch, in the same order as the input paths
+        """
+        loader = BatchLoader(paths, self.image_size, self.batch_size, self.num_workers, self.prefetch, self.read_fn, self.normalize_fn)
+        for batch_paths, batch in loader:
+            start_time = time.perf_counter()
+            predictions = np.asarray(self.predict_fn(batch))
+            self.last_predict_start = start_time
+            self.last_predict_time = time.perf_counter() - start_time
+            yield batch_paths, predictions
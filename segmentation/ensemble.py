@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import cv2 as cv
+
+from segmentation.engine import normalize
+
+FUSIONS = ("mean", "vote", "weighted")
+
+
+def read_multi_size(path, image_sizes):
+    """
+    Decodes an image once and resizes it to every input size. Returns {image_size: uint8 image}
+    """
+    ori_x = cv.imread(path, cv.IMREAD_COLOR)
+    if ori_x is None:
+        raise IOError("Could not read image: " + str(path))
+    return {image_size: cv.resize(ori_x, (image_size, image_size)) for image_size in set(image_sizes)}
+
+
+class Ensemble:
+    """
+    Fuses the predictions of several models on a shared batch of images.
+    members: {model_name: (predict_fn, image_size)}. Predictions of members with a different input size are resized
+    to output_size (by default the largest input size) before being fused:
+    - mean: mean of the probabilities > threshold.
+    - vote: majority vote of the binary masks.
+    - weighted: weighted mean of the probabilities > threshold (weights: {model_name: weight}, e.g. the IoU of each model).
+    thresholds ({model_name: threshold}) and normalize_fns ({model_name: normalization}, e.g. ModelRegistry.normalize_fn)
+    are the prediction threshold and input normalization of every member (by default threshold and engine.normalize).
+    With different thresholds, mean and weighted compare the fused probabilities to the (weighted) mean of the thresholds.
+    If latency_budget (s per image) is set, the slowest members are skipped so that the estimated time of the
+    members that run stays within the budget (at least the fastest member always runs).
+    """
+    def __init__(self, members, fusion="mean", weights=None, threshold=0.5, latency_budget=None, output_size=None,
+                 thresholds=None, normalize_fns=None):
+        if fusion not in FUSIONS:
+            raise ValueError("Unknown fusion: " + str(fusion) + ". Options: " + ", ".join(FUSIONS))
+        if fusion == "weighted" and not weights:
+            raise ValueError("The weighted fusion needs the weights of the members")
+        self.members = dict(members)
+        self.fusion = fusion
+        self.weights = dict(weights) if weights else {model_name: 1.0 for model_name in self.members}
+        self.threshold = threshold
+        self.thresholds = {model_name: (thresholds or {}).get(model_name, threshold) for model_name in self.members}
+        self.normalize_fns = {model_name: (normalize_fns or {}).get(model_name, normalize) for model_name in self.members}
+        self.latency_budget = latency_budget
+        self.output_size = output_size or max(image_size for _, image_size in self.members.values())
+        self.image_sizes = sorted(set(image_size for _, image_size in self.members.values()))
+        #Estimated time per image of every member (exponential moving average)
+        self.member_latency = {}
+
+    def active_members(self):
+        if self.latency_budget is None or len(self.member_latency) < len(self.members):
+            return list(self.members)
+        selected = []
+        total = 0.0
+        for model_name in sorted(self.members, key=lambda name: self.member_latency[name]):
+            if selected and total + self.member_latency[model_name] > self.latency_budget:
+                break
+            selected.append(model_name)
+            total += self.member_latency[model_name]
+        return selected
+
+    def predict(self, images):
+        """
+        images: {image_size: uint8 batch (N, S, S, 3)} with the same images at every input size of the members.
+        Returns the fused masks (N, output_size, output_size) uint8 (0/255) and the names of the members that ran
+        """
+        selected = self.active_members()
+        inputs = {} #Normalized once per input size and normalization
+        n_images = len(next(iter(images.values())))
+        fused = np.zeros((n_images, self.output_size, self.output_size), dtype=np.float32)
+        total_weight = 0.0
+        total_threshold = 0.0
+        for model_name in selected:
+            predict_fn, image_size = self.members[model_name]
+            normalize_fn = self.normalize_fns[model_name]
+            if (image_size, normalize_fn) not in inputs:
+                inputs[(image_size, normalize_fn)] = normalize_fn(images[image_size])
+            start_time = time.time()
+            preds = np.asarray(predict_fn(inputs[(image_size, normalize_fn)]), dtype=np.float32)
+            latency = (time.time() - start_time) / n_images
+            previous = self.member_latency.get(model_name)
+            self.member_latency[model_name] = latency if previous is None else 0.8*previous + 0.2*latency
+            if preds.ndim == 4:
+                preds = preds[..., 0]
+            if image_size != self.output_size:
+                preds = np.stack([cv.resize(pred, (self.output_size, self.output_size), interpolation=cv.INTER_LINEAR) for pred in preds])
+            weight = self.weights.get(model_name, 0.0) if self.fusion == "weighted" else 1.0
+            if self.fusion == "vote":
+                fused += preds > self.thresholds[model_name]
+            else:
+                fused += weight * preds
+            total_weight += weight
+            total_threshold += weight * self.thresholds[model_name]
+        if self.fusion == "vote":
+            masks = fused > len(selected) / 2.0
+        else:
+            masks = fused > total_threshold
+        return masks.astype(np.uint8) * 255, selected
+
+    def warmup(self, n_images=1):
+        """
+        Runs every member once to measure its latency, needed to apply the latency budget
+        """
+        images = {image_size: np.zeros((n_images, image_size, image_size, 3), dtype=np.uint8) for image_size in self.image_sizes}
+        latency_budget = self.latency_budget
+        self.latency_budget = None
+        try:
+            self.predict(images)
+        finally:
+            self.latency_budget = latency_budget
+        return dict(self.member_latency)
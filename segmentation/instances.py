@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2 as cv
+
+#Neighbors of a pixel in the order of the Zhang-Suen thinning (P2..P9: clockwise from the top), as (dy, dx)
+_NEIGHBORS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def _thinning_tables():
+    """
+    Lookup tables (neighborhood code -> value) of the two Zhang-Suen sub-iterations (1: remove the pixel) and of the
+    number of 0->1 transitions around the pixel (3 or more: junction of branches)
+    """
+    codes = np.arange(256)
+    p = [(codes >> k) & 1 for k in range(8)] #p[0] = P2, ..., p[7] = P9
+    n_neighbors = sum(p)
+    transitions = sum(((p[k] == 0) & (p[(k+1) % 8] == 1)).astype(int) for k in range(8))
+    common = (n_neighbors >= 2) & (n_neighbors <= 6) & (transitions == 1)
+    first = common & (p[0]*p[2]*p[4] == 0) & (p[2]*p[4]*p[6] == 0)
+    second = common & (p[0]*p[2]*p[6] == 0) & (p[0]*p[4]*p[6] == 0)
+    return first.astype(np.uint8), second.astype(np.uint8), transitions.astype(np.uint8)
+
+
+_REMOVE_FIRST, _REMOVE_SECOND, _TRANSITIONS = _thinning_tables()
+_CODE_KERNEL = np.zeros((3, 3), dtype=np.float32)
+for _bit, (_dy, _dx) in enumerate(_NEIGHBORS):
+    _CODE_KERNEL[1+_dy, 1+_dx] = 1 << _bit
+
+
+def neighbor_codes(image):
+    """
+    8-bit code of the 8 neighbors of every pixel of a binary uint8 image (0/1), computed with one cv.filter2D
+    """
+    return cv.filter2D(image, -1, _CODE_KERNEL, borderType=cv.BORDER_CONSTANT)
+
+
+def thin(mask):
+    """
+    Zhang-Suen thinning of one mask. Every sub-iteration is a filter2D (neighborhood codes) and a cv.LUT (pixels to remove)
+    over the whole image. Returns a uint8 image with 1 in the skeleton pixels
+    """
+    image = (np.asarray(mask) > 0).astype(np.uint8)
+    while True:
+        changed = False
+        for table in (_REMOVE_FIRST, _REMOVE_SECOND):
+            remove = cv.LUT(neighbor_codes(image), table) & image
+            if cv.countNonZero(remove):
+                image -= remove
+                changed = True
+        if not changed:
+            return image
+
+
+def skeletonize(masks, num_workers=4):
+    """
+    One pixel wide skeletons of a stack of masks (N, H, W) or of a single mask (H, W), as boolean arrays.
+    The masks of the stack are thinned in parallel threads (OpenCV releases the GIL).
+    """
+    masks = np.asarray(masks)
+    if masks.ndim == 2:
+        return thin(masks) > 0
+    if num_workers > 1 and len(masks) > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            skeletons = list(pool.map(thin, masks))
+    else:
+        skeletons = [thin(mask) for mask in masks]
+    return np.stack(skeletons) > 0 if skeletons else np.zeros(masks.shape, dtype=bool)
+
+
+def _order_branch(branch):
+    """
+    Pixels (x, y) of a one pixel wide branch in order along it, from its contour: the contour of an open curve goes
+    from one end to the other and back, so it is cut at the points where it turns back
+    """
+    contours, _ = cv.findContours(branch, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_NONE)
+    if not contours:
+        return None
+    points = max(contours, key=len)[:, 0, :]
+    if len(points) < 3:
+        return points
+    turns = np.flatnonzero(np.all(np.roll(points, 1, axis=0) == np.roll(points, -1, axis=0), axis=1))
+    if turns.size == 0:
+        return np.concatenate([points, points[:1]]) #Closed loop
+    points = np.roll(points, -turns[0], axis=0)
+    end = (turns[1] - turns[0]) % len(points) if turns.size > 1 else len(points) - 1
+    return points[:end + 1]
+
+
+def centerlines(skeleton, labels=None, min_length=10, epsilon=1.0):
+    """
+    Splits a skeleton (H, W) into branches at its junctions and returns a list of (label, polyline), where polyline
+    is an (K, 2) int32 array of (x, y) points simplified with cv.approxPolyDP (epsilon in pixels) and label is the
+    value of labels at the branch (e.g. the connected component), or 0 without labels
+    """
+    skeleton = (np.asarray(skeleton) > 0).astype(np.uint8)
+    #Junctions: skeleton pixels with 3 or more separate groups of neighbors (the number of neighbors would also mark the
+    #corners of diagonal staircases). They are dilated so the arms do not stay connected through diagonal neighbors
+    junctions = ((cv.LUT(neighbor_codes(skeleton), _TRANSITIONS) >= 3) & (skeleton > 0)).astype(np.uint8)
+    junctions = cv.dilate(junctions, np.ones((3, 3), dtype=np.uint8))
+    branches = skeleton & (1 - junctions)
+    n_branches, branch_labels, stats, _ = cv.connectedComponentsWithStats(branches, connectivity=8)
+    polylines = []
+    for branch_id in range(1, n_branches):
+        x, y, width, height, length = stats[branch_id]
+        if length < min_length:
+            continue
+        crop = (branch_labels[y:y+height, x:x+width] == branch_id).astype(np.uint8)
+        points = _order_branch(np.pad(crop, 1))
+        if points is None:
+            continue
+        points = points - 1 + np.array([x, y], dtype=points.dtype)
+        polyline = cv.approxPolyDP(points.reshape(-1, 1, 2).astype(np.int32), epsilon, False)[:, 0, :]
+        label = int(labels[points[0, 1], points[0, 0]]) if labels is not None else 0
+        polylines.append((label, polyline))
+    return polylines
+
+
+def extract_instances(masks, min_area=50, min_length=10, epsilon=1.0, num_workers=4):
+    """
+    Cable instances of a stack of predicted masks (N, H, W) or of a single mask (H, W). For every mask, returns a list
+    of dicts (one per connected component with at least min_area pixels) with the id, area, bbox (x, y, w, h),
+    centroid (x, y), skeleton length in pixels and the centerline polylines of the cable.
+    The skeletons of the whole stack are computed at once.
+    """
+    masks = np.asarray(masks)
+    single = masks.ndim == 2
+    masks = (masks[None] if single else masks) > 0
+    results = []
+    components = [cv.connectedComponentsWithStats(mask.view(np.uint8), connectivity=8) for mask in masks]
+    #Small components are removed before the thinning
+    for mask, (n_components, labels, stats, _) in zip(masks, components):
+        small = np.flatnonzero(stats[:, cv.CC_STAT_AREA] < min_area)
+        small = small[small > 0]
+        if small.size:
+            mask &= ~np.isin(labels, small)
+    skeletons = skeletonize(masks, num_workers)
+    for skeleton, (n_components, labels, stats, centroids) in zip(skeletons, components):
+        instances = {}
+        for component_id in range(1, n_components):
+            if stats[component_id, cv.CC_STAT_AREA] < min_area:
+                continue
+            x, y, width, height, area = (int(v) for v in stats[component_id])
+            instances[component_id] = {'id': component_id, 'area': area, 'bbox': (x, y, width, height),
+                                       'centroid': (float(centroids[component_id][0]), float(centroids[component_id][1])),
+                                       'length': 0, 'polylines': []}
+        lengths = np.bincount(labels[skeleton], minlength=n_components)
+        for component_id in instances:
+            instances[component_id]['length'] = int(lengths[component_id])
+        for label, polyline in centerlines(skeleton, labels, min_length, epsilon):
+            if label in instances:
+                instances[label]['polylines'].append(polyline)
+        results.append(list(instances.values()))
+    return results[0] if single else results
+
+
+def instances_to_json(instances):
+    """
+    JSON serializable copy of the instances of one mask
+    """
+    return [dict(instance, bbox=list(instance['bbox']), centroid=list(instance['centroid']),
+                 polylines=[polyline.tolist() for polyline in instance['polylines']]) for instance in instances]
+
+
+def draw_instances(image, instances):
+    """
+    Draws the centerlines of the instances over a copy of the image, with a different color per instance
+    """
+    image = image.copy() if image.ndim == 3 else cv.cvtColor(image, cv.COLOR_GRAY2BGR)
+    for instance in instances:
+        color = tuple(int(c) for c in np.random.RandomState(instance['id']).randint(64, 256, 3))
+        for polyline in instance['polylines']:
+            cv.polylines(image, [polyline.reshape(-1, 1, 2)], False, color, 2)
+        cv.putText(image, str(instance['id']), (int(instance['centroid'][0]), int(instance['centroid'][1])),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    return image
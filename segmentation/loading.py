@@ -0,0 +1,20 @@
+import os
+
+
+def load_predict_fn(path_models_dir, model_name, image_size, inference_mode="graph", tflite_quantization="float16",
+                    warmup_batch_size=1):
+    """
+    Loads a model for inference only and returns its predict function (float32 batch -> predictions).
+    TensorFlow is imported on first use and the model is not compiled.
+    inference_mode: "graph" (traced tf.function, warmed up), "keras" (model.predict) or "tflite" (quantized TFLite model)
+    """
+    if inference_mode == "tflite":
+        from segmentation.tflite_backend import load_tflite, tflite_path
+        return load_tflite(tflite_path(path_models_dir, model_name, tflite_quantization), image_size,
+                           warmup_batch_size=warmup_batch_size)
+    import tensorflow as tf
+    model = tf.keras.models.load_model(os.path.join(path_models_dir, model_name), compile=False)
+    if inference_mode == "graph":
+        from segmentation.serving import compile_model
+        return compile_model(model, image_size, warmup_batch_size)
+    return model.predict
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def model_fingerprint(path_model, *extra):
+    """
+    Fingerprint of a saved model (relative path, size and modification time of all its files) and any extra
+    settings that change its predictions (e.g. the inference mode)
+    """
+    sha1 = hashlib.sha1()
+    if os.path.isdir(path_model):
+        for root, dirs, files in os.walk(path_model):
+            dirs.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                stat = os.stat(path)
+                sha1.update((os.path.relpath(path, path_model) + "|" + str(stat.st_size) + "|" + str(stat.st_mtime_ns) + "\n").encode("utf-8"))
+    elif os.path.isfile(path_model):
+        sha1.update(file_hash(path_model).encode("utf-8"))
+    for value in extra:
+        sha1.update(("|" + str(value)).encode("utf-8"))
+    return sha1.hexdigest()
+
+
+class PredictionManifest:
+    """
+    Records, for every model, the settings its predictions were made with (model fingerprint, input size, threshold)
+    and, for every image, the hashes of the image and ground truth mask and the [TP, FP, FN, TN] of the saved prediction.
+    Used to only run the models on new or changed images.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._hashes = {}
+        self.data = {'version': MANIFEST_VERSION, 'models': {}}
+        if os.path.isfile(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.data = data
+
+    def _hash(self, path):
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(path)
+        return self._hashes[key]
+
+    def model_entry(self, model_name, fingerprint, image_size, threshold):
+        """
+        Returns the entry of the model, discarding its images if the model or its settings changed
+        """
+        settings = {'fingerprint': fingerprint, 'image_size': image_size, 'threshold': threshold}
+        entry = self.data['models'].get(model_name)
+        if entry is None or any(entry.get(key) != value for key, value in settings.items()):
+            entry = dict(settings, images={})
+            self.data['models'][model_name] = entry
+        return entry
+
+    def stale_images(self, model_name, image_names, path_image_dir, path_masks_dir, path_predictions_dir):
+        """
+        Images whose prediction is missing or out of date (new or changed image or ground truth mask)
+        """
+        images = self.data['models'][model_name]['images']
+        stale = []
+        for image_name in image_names:
+            record = images.get(image_name)
+            if (record is None or not os.path.isfile(os.path.join(path_predictions_dir, image_name))
+                    or record['image_hash'] != self._hash(os.path.join(path_image_dir, image_name))
+                    or record['mask_hash'] != self._hash(os.path.join(path_masks_dir, image_name))):
+                stale.append(image_name)
+        return stale
+
+    def update(self, model_name, image_name, counts, path_image_dir, path_masks_dir):
+        self.data['models'][model_name]['images'][image_name] = {
+            'image_hash': self._hash(os.path.join(path_image_dir, image_name)),
+            'mask_hash': self._hash(os.path.join(path_masks_dir, image_name)),
+            'counts': [int(n) for n in counts]}
+
+    def prune(self, model_name, image_names):
+        """
+        Removes the images that are not in image_names anymore
+        """
+        images = self.data['models'][model_name]['images']
+        for image_name in set(images) - set(image_names):
+            del images[image_name]
+
+    def counts(self, model_name, image_names):
+        """
+        [TP, FP, FN, TN] of the images, shape (N, 4)
+        """
+        images = self.data['models'][model_name]['images']
+        return np.array([images[image_name]['counts'] for image_name in image_names], dtype=np.int64).reshape(-1, 4)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+def write_result_coefficients(path, metrics_avg):
+    """
+    Writes the average metrics of every model in the format of result_coefficients.txt
+    """
+    with open(path, "w") as f:
+        for model_name in metrics_avg:
+            f.write(model_name + "\n")
+            for metric_i in metrics_avg[model_name]:
+                f.write("\t- " + metric_i + ": " + str(metrics_avg[model_name][metric_i]) + "\n")
+            f.write("\n")
@@ -0,0 +1,58 @@
+import numpy as np
+
+#Pixels are encoded as pred*2 + gt, so the bincount bins are [TN, FN, FP, TP]
+_TN, _FN, _FP, _TP = range(4)
+_MAX_CHUNK_PIXELS = 1 << 24
+
+
+def confusion_matrix(pred, gt):
+    """
+    Counts TP, FP, FN and TN between predicted and ground truth masks (any nonzero pixel is a cable pixel).
+    pred and gt can be a single mask (H, W) or a stack of masks (..., H, W). Every mask is counted in a single
+    bincount pass over its encoded pixels. Returns an int64 array of shape (..., 4) with [TP, FP, FN, TN].
+    """
+    pred = np.asarray(pred)
+    gt = np.asarray(gt)
+    if pred.shape != gt.shape:
+        raise ValueError("Mask shapes do not match: " + str(pred.shape) + " vs " + str(gt.shape))
+    if pred.ndim < 2:
+        raise ValueError("Masks must have at least 2 dimensions, got shape " + str(pred.shape))
+    lead_shape = pred.shape[:-2]
+    n_pixels = pred.shape[-1] * pred.shape[-2]
+    code = (pred > 0).view(np.uint8) << 1
+    code |= (gt > 0).view(np.uint8)
+    code = code.reshape(-1, n_pixels)
+    n_masks = code.shape[0]
+
+    counts = np.empty((n_masks, 4), dtype=np.int64)
+    chunk = max(1, _MAX_CHUNK_PIXELS // max(1, n_pixels))
+    for start in range(0, n_masks, chunk):
+        block = code[start:start+chunk]
+        #Offset every mask to its own group of 4 bins so the whole block is counted at once
+        offsets = (np.arange(block.shape[0], dtype=np.intp) * 4)[:, None]
+        bins = np.bincount((block + offsets).ravel(), minlength=4*block.shape[0])
+        counts[start:start+block.shape[0]] = bins.reshape(-1, 4)
+
+    result = counts[:, [_TP, _FP, _FN, _TN]]
+    return result.reshape(lead_shape + (4,))
+
+
+def segmentation_metrics(pred, gt):
+    """
+    Returns a dict with the TP, FP, TN, FN, IoU and Dice of every mask in the stack (see confusion_matrix).
+    IoU and Dice are 1.0 when both masks are empty.
+    """
+    return metrics_from_counts(confusion_matrix(pred, gt))
+
+
+def metrics_from_counts(counts):
+    """
+    Same as segmentation_metrics, from already computed [TP, FP, FN, TN] counts of shape (..., 4)
+    """
+    counts = np.asarray(counts)
+    tp, fp, fn, tn = (counts[..., k] for k in range(4))
+    union = tp + fp + fn
+    safe_union = np.where(union > 0, union, 1)
+    iou = np.where(union > 0, tp / safe_union, 1.0)
+    dice = np.where(union > 0, (2*tp) / (tp + safe_union), 1.0)
+    return {'TP': tp, 'FP': fp, 'TN': tn, 'FN': fn, 'IoU': iou, 'Dice': dice}
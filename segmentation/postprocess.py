@@ -0,0 +1,16 @@
+import numpy as np
+
+
+def prediction_to_mask(pred, threshold=0.5):
+    """
+    Converts the sigmoid output of the model into a single-channel uint8 mask (0 background, 255 cable).
+    pred can be one prediction (H, W, 1) or a batch (N, H, W, 1). The result is written into a single uint8 array,
+    which is used both to compute the metrics and to save the prediction.
+    """
+    pred = np.asarray(pred)
+    if pred.shape[-1] == 1:
+        pred = pred[..., 0]
+    mask = np.empty(pred.shape, dtype=np.uint8)
+    np.greater(pred, threshold, out=mask, casting='unsafe')
+    mask *= 255
+    return mask
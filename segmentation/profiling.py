@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import collections
+
+from segmentation.benchmark import summarize
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Opt-in instrumentation: records a span for every stage of every image/model pair and exports them as a
+    Chrome trace (chrome://tracing or https://ui.perfetto.dev) and a JSON summary with the slowest images of every
+    model. When it is disabled, span() returns a shared empty context and wrap() returns the function unchanged,
+    so the instrumented code runs as before.
+    With tf_trace_dir, the forward passes inside tf_trace() are also captured by the TensorFlow profiler (TensorBoard).
+    """
+    def __init__(self, enabled=False, tf_trace_dir=None):
+        self.enabled = enabled
+        self.tf_trace_dir = tf_trace_dir if enabled else None
+        self.events = []
+        self.image_times = collections.defaultdict(lambda: collections.defaultdict(float)) #(model, image): {stage: s}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def span(self, name, model=None, image=None, **args):
+        """
+        Context manager that records a span, e.g. with profiler.span("forward", model="unet"): ...
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name, model, image, args)
+
+    @contextlib.contextmanager
+    def _span(self, name, model, image, args):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start_time, time.perf_counter() - start_time, model, image, **args)
+
+    def add(self, name, start_time, duration, model=None, image=None, **args):
+        """
+        Records a span measured elsewhere (start_time from time.perf_counter, duration in seconds)
+        """
+        if not self.enabled:
+            return
+        if model is not None:
+            args['model'] = model
+        if image is not None:
+            args['image'] = image
+        event = {'name': name, 'cat': model or "pipeline", 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                 'ts': (start_time - self._origin) * 1e6, 'dur': duration * 1e6, 'args': args}
+        with self._lock:
+            self.events.append(event)
+            if image is not None:
+                self.image_times[(model, image)][name] += duration
+
+    def add_batch(self, name, start_time, duration, model, images, **args):
+        """
+        Records a span of a whole batch and attributes an equal share of its duration to each of its images
+        """
+        if not self.enabled:
+            return
+        self.add(name, start_time, duration, model, None, images=list(images), **args)
+        with self._lock:
+            for image in images:
+                self.image_times[(model, image)][name] += duration / max(1, len(images))
+
+    def wrap(self, name, fn, model=None):
+        """
+        Returns fn recording a span for every call. The image name is taken from the first argument (a path)
+        """
+        if not self.enabled or fn is None:
+            return fn
+        def wrapper(path, *args, **kwargs):
+            with self._span(name, model, os.path.basename(str(path)), {}):
+                return fn(path, *args, **kwargs)
+        return wrapper
+
+    def tf_trace(self):
+        """
+        Context manager that captures a TensorFlow profiler trace in tf_trace_dir (no-op without tf_trace_dir)
+        """
+        if self.tf_trace_dir is None:
+            return _NO_SPAN
+        return self._tf_trace()
+
+    @contextlib.contextmanager
+    def _tf_trace(self):
+        import tensorflow as tf
+        tf.profiler.experimental.start(self.tf_trace_dir)
+        try:
+            yield
+        finally:
+            tf.profiler.experimental.stop()
+
+    def stage_summary(self):
+        durations = collections.OrderedDict()
+        for event in self.events:
+            durations.setdefault(event['name'], []).append(event['dur'] / 1e6)
+        return collections.OrderedDict((name, summarize(values)) for name, values in durations.items())
+
+    def slowest_images(self, n=10):
+        """
+        Returns {model: [{'image', 'total_ms', stage: ms, ...}, ...]} with the n slowest images of every model
+        """
+        per_model = collections.defaultdict(list)
+        for (model, image), stages in self.image_times.items():
+            entry = {'image': image, 'total_ms': sum(stages.values()) * 1000}
+            entry.update({stage + "_ms": duration * 1000 for stage, duration in stages.items()})
+            per_model[model].append(entry)
+        return {model: sorted(entries, key=lambda entry: -entry['total_ms'])[:n] for model, entries in per_model.items()}
+
+    def print_slowest(self, n=5):
+        for model, entries in self.slowest_images(n).items():
+            print("Slowest images - " + str(model) + ":")
+            for entry in entries:
+                stages = ", ".join(key[:-3] + " " + str(round(value, 1)) + "ms" for key, value in entry.items() if key not in ('image', 'total_ms'))
+                print("\t- " + entry['image'] + ": " + str(round(entry['total_ms'], 1)) + "ms (" + stages + ")")
+
+    def export(self, trace_path, summary_path=None, n_slowest=10):
+        """
+        Writes the Chrome trace (trace_path) and the JSON summary of the stages and slowest images (summary_path)
+        """
+        if not self.enabled:
+            return
+        folder = os.path.dirname(trace_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(trace_path, "w") as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        if summary_path is not None:
+            with open(summary_path, "w") as f:
+                json.dump({'stages': self.stage_summary(), 'slowest_images': self.slowest_images(n_slowest)}, f, indent=2)
@@ -0,0 +1,206 @@
+import os
+import gc
+import json
+import time
+import threading
+import collections
+
+from segmentation.engine import normalize
+from segmentation.loading import load_predict_fn
+
+#Description of every trained model. They can be overridden or extended with models/registry.json, e.g.
+#{"unet": {"image_size": 512, "threshold": 0.4}, "my_model": {"image_size": 256, "path": "my_model_v2"}}
+DEFAULT_MODELS = collections.OrderedDict([
+    ('unet', {'image_size': 512}),
+    ('deeplabv3p', {'image_size': 512}),
+    ('fcn', {'image_size': 512}),
+    ('fpn', {'image_size': 512}),
+    ('linknet', {'image_size': 512}),
+    ('pspnet', {'image_size': 480}),
+])
+NORMALIZATIONS = {'unit': normalize} #"unit": uint8 BGR image / 255
+REGISTRY_FILE = "registry.json"
+
+
+class ModelSpec:
+    """
+    Input size, normalization, prediction threshold and saved model folder (relative to the models folder) of a model
+    """
+    def __init__(self, name, image_size, normalization="unit", threshold=0.5, path=None):
+        if normalization not in NORMALIZATIONS:
+            raise ValueError("Unknown normalization: " + str(normalization) + ". Use one of " + str(list(NORMALIZATIONS)))
+        self.name = name
+        self.image_size = int(image_size)
+        self.normalization = normalization
+        self.threshold = float(threshold)
+        self.path = path if path is not None else name
+
+
+class ModelRegistry:
+    """
+    Registry of the trained models (DEFAULT_MODELS, updated with models/registry.json if it exists)
+    """
+    def __init__(self, models_dir, models=None):
+        self.models_dir = models_dir
+        descriptions = collections.OrderedDict((name, dict(spec)) for name, spec in (models or DEFAULT_MODELS).items())
+        registry_path = os.path.join(models_dir, REGISTRY_FILE)
+        if models is None and os.path.isfile(registry_path):
+            with open(registry_path) as f:
+                for name, spec in json.load(f).items():
+                    descriptions.setdefault(name, {}).update(spec)
+        self.specs = collections.OrderedDict((name, ModelSpec(name, **spec)) for name, spec in descriptions.items())
+
+    def names(self):
+        return list(self.specs)
+
+    def spec(self, model_name):
+        if model_name not in self.specs:
+            raise KeyError("Unknown model: " + str(model_name) + ". Available models: " + ", ".join(self.specs))
+        return self.specs[model_name]
+
+    def image_size(self, model_name):
+        return self.spec(model_name).image_size
+
+    def threshold(self, model_name):
+        return self.spec(model_name).threshold
+
+    def path(self, model_name):
+        return os.path.join(self.models_dir, self.spec(model_name).path)
+
+    def tflite_path(self, model_name, quantization):
+        """
+        TFLite model exported with export_tflite.py (see tflite_backend.tflite_path)
+        """
+        return os.path.join(self.models_dir, self.spec(model_name).path + "_" + quantization + ".tflite")
+
+    def sizes(self):
+        """
+        {model name: input size}, the former model_list of the scripts
+        """
+        return collections.OrderedDict((name, spec.image_size) for name, spec in self.specs.items())
+
+    def normalize_fn(self, model_name):
+        """
+        Normalization function of a model (uint8 images -> float32 inputs), picklable for the sweep worker processes
+        """
+        return NORMALIZATIONS[self.spec(model_name).normalization]
+
+    def normalize(self, model_name, images):
+        return self.normalize_fn(model_name)(images)
+
+    def load(self, model_name, inference_mode="graph", tflite_quantization="float16", warmup_batch_size=1):
+        """
+        Loads a model for inference (with warm-up in graph and tflite modes), see loading.load_predict_fn
+        """
+        spec = self.spec(model_name)
+        return load_predict_fn(self.models_dir, spec.path, spec.image_size, inference_mode, tflite_quantization, warmup_batch_size)
+
+
+def model_bytes(predict_fn):
+    """
+    Memory of the weights of a loaded model in bytes (the model file size for TFLite models)
+    """
+    model = getattr(predict_fn, "model", None) or getattr(predict_fn, "__self__", None)
+    weights = getattr(model, "weights", None)
+    if weights is not None:
+        return int(sum(int(w.shape.num_elements() or 0) * w.dtype.size for w in weights))
+    path = getattr(predict_fn, "path", None)
+    if path is not None and os.path.isfile(path):
+        return os.path.getsize(path)
+    return 0
+
+
+def current_rss_mb():
+    """
+    Current resident memory of the process in MB (None if it cannot be measured)
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024**2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class WarmPool:
+    """
+    Keeps the models of a registry loaded, loading each one on first use (with warm-up). When the weights of the
+    resident models exceed max_mb, the least recently used models are released.
+    It is the pool of the warm model process (warm_model.serve): get() returns (predict_fn, image_size, load_time).
+    """
+    def __init__(self, registry, max_mb=4096, inference_mode="graph", tflite_quantization="float16", warmup_batch_size=1):
+        self.registry = registry
+        self.max_bytes = max_mb * 1024**2
+        self.inference_mode = inference_mode
+        self.tflite_quantization = tflite_quantization
+        self.warmup_batch_size = warmup_batch_size
+        self._models = collections.OrderedDict() #Least recently used first
+        self._stats = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name):
+        """
+        Returns (predict_fn, image_size, load_time), load_time is 0 if the model was already loaded
+        """
+        with self._lock:
+            stats = self._stats.setdefault(model_name, {'loads': 0, 'hits': 0, 'load_time': None, 'weights_mb': None, 'rss_delta_mb': None})
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                stats['hits'] += 1
+                return self._models[model_name], self.registry.image_size(model_name), 0.0
+            rss_before = current_rss_mb()
+            start_time = time.time()
+            predict_fn = self.registry.load(model_name, self.inference_mode, self.tflite_quantization, self.warmup_batch_size)
+            load_time = time.time() - start_time
+            rss_after = current_rss_mb()
+            self._models[model_name] = predict_fn
+            stats['loads'] += 1
+            stats['load_time'] = load_time
+            stats['weights_mb'] = model_bytes(predict_fn) / 1024**2
+            stats['rss_delta_mb'] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            self._evict(keep=model_name)
+            return predict_fn, self.registry.image_size(model_name), load_time
+
+    def normalize(self, model_name, images):
+        return self.registry.normalize(model_name, images)
+
+    def threshold(self, model_name):
+        return self.registry.threshold(model_name)
+
+    def resident(self):
+        return list(self._models)
+
+    def resident_mb(self):
+        return sum(self._stats[model_name]['weights_mb'] for model_name in self._models)
+
+    def release(self, model_name):
+        with self._lock:
+            self._release(model_name)
+
+    def _release(self, model_name):
+        if self._models.pop(model_name, None) is not None:
+            gc.collect()
+
+    def _evict(self, keep):
+        for model_name in list(self._models):
+            if self.resident_mb() * 1024**2 <= self.max_bytes:
+                break
+            if model_name != keep:
+                print("Model pool: releasing " + str(model_name) + " (memory limit)")
+                self._release(model_name)
+
+    def stats(self):
+        """
+        Loads, hits, last load time (s), weights size (MB) and resident memory growth of the load (MB) of every model
+        """
+        with self._lock:
+            return {model_name: dict(stats, resident=model_name in self._models) for model_name, stats in self._stats.items()}
+
+    def print_stats(self):
+        for model_name, stats in self.stats().items():
+            rss = str(round(stats['rss_delta_mb'], 1)) + " MB" if stats['rss_delta_mb'] is not None else "unknown"
+            print("\t- " + model_name + ": load time " + str(stats['load_time']) + "s, weights " + str(round(stats['weights_mb'], 1)) + " MB, resident memory growth " + rss + ", " + str(stats['loads']) + " loads, " + str(stats['hits']) + " hits" + (" (resident)" if stats['resident'] else ""))
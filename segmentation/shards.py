@@ -0,0 +1,160 @@
+import os
+import io
+import json
+import glob
+import tarfile
+import time
+
+#WebDataset style shards: tar files with the files of each sample stored consecutively (<key>.image.png,
+#<key>.mask.png, <key>.json), plus a JSON lines index with the shard and metadata of every sample.
+#Only the standard library is needed to write them, so they can be written from Blender's Python (numpy and OpenCV
+#are only imported to decode the samples).
+
+INDEX_PREFIX = "index"
+
+
+class ShardWriter:
+    """
+    Appends samples to shards of samples_per_shard samples in output_dir. Several writers (e.g. one per Blender
+    worker) can write to the same folder with different names. A new shard is started on every run, so an
+    interrupted shard is never appended to.
+    """
+
+    def __init__(self, output_dir, name="shard", samples_per_shard=500):
+        self.output_dir = output_dir
+        self.name = name
+        self.samples_per_shard = samples_per_shard
+        self.index_path = os.path.join(output_dir, INDEX_PREFIX + "-" + name + ".jsonl")
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.shard_number = len(glob.glob(os.path.join(output_dir, name + "-*.tar")))
+        self.tar = None
+        self.shard_path = None
+        self.shard_samples = 0
+        self.index = open(self.index_path, "a")
+        #An interrupted run can leave a partial last line: start on a new line so the next record is not lost with it
+        if self.index.tell() > 0:
+            with open(self.index_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.index.write("\n")
+
+
+    def keys(self):
+        """
+        Keys of the samples already written to output_dir (by any writer)
+        """
+        return set(record["key"] for record in read_index(self.output_dir, recursive=False))
+
+
+    def open_shard(self):
+        self.shard_path = os.path.join(self.output_dir, self.name + "-" + "{:05d}".format(self.shard_number) + ".tar")
+        self.tar = tarfile.open(self.shard_path, "w")
+        self.shard_number += 1
+        self.shard_samples = 0
+
+
+    def write(self, key, files, metadata):
+        """
+        Writes a sample. files: {extension: bytes}, e.g. {"image.png": ..., "mask.png": ...}. metadata: JSON serializable dict
+        """
+        if self.tar is None or self.shard_samples >= self.samples_per_shard:
+            self.close_shard()
+            self.open_shard()
+        metadata = dict(metadata, key=key)
+        files = dict(files)
+        files["json"] = json.dumps(metadata).encode("utf-8")
+        for extension, data in files.items():
+            info = tarfile.TarInfo(key + "." + extension)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.tar.addfile(info, io.BytesIO(data))
+        self.tar.fileobj.flush()
+        self.shard_samples += 1
+        #The sample is indexed once it is in the shard
+        self.index.write(json.dumps(dict(metadata, shard=os.path.basename(self.shard_path))) + "\n")
+        self.index.flush()
+
+
+    def close_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+
+    def close(self):
+        self.close_shard()
+        self.index.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_index(dataset_dir, recursive=True):
+    """
+    Reads the index records of all the shards in dataset_dir (and its subfolders). Every record has the key,
+    the shard (path relative to dataset_dir) and the metadata of a sample
+    """
+    pattern = os.path.join(dataset_dir, "**", INDEX_PREFIX + "-*.jsonl") if recursive else os.path.join(dataset_dir, INDEX_PREFIX + "-*.jsonl")
+    records = []
+    for index_path in sorted(glob.glob(pattern, recursive=recursive)):
+        folder = os.path.relpath(os.path.dirname(index_path), dataset_dir)
+        with open(index_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue #Line cut by an interrupted run
+                record["shard"] = os.path.normpath(os.path.join(folder, record["shard"]))
+                records.append(record)
+    return records
+
+
+def iter_shards(dataset_dir, select=None, decode=True, image_size=None):
+    """
+    Reads the samples of the shards sequentially. Yields (key, image, mask, metadata), with the images decoded
+    (BGR image, grayscale mask) and resized to image_size if given, or the PNG bytes if decode is False.
+    select: optional function of the metadata, only the samples for which it returns True are read
+    e.g. iter_shards(path, select=lambda m: m["category"] == "HDR_far")
+    """
+    records = read_index(dataset_dir)
+    shards = {}
+    for record in records:
+        if select is None or select(record):
+            shards.setdefault(record["shard"], {})[record["key"]] = record
+    for shard, shard_records in shards.items():
+        sample = {}
+        with tarfile.open(os.path.join(dataset_dir, shard), "r|") as tar:
+            try:
+                for member in tar:
+                    key, extension = member.name.split(".", 1)
+                    if key not in shard_records or extension == "json":
+                        continue
+                    sample[extension] = tar.extractfile(member).read()
+                    if "image.png" in sample and "mask.png" in sample:
+                        yield decode_sample(key, sample, shard_records[key], decode, image_size)
+                        sample = {}
+            except tarfile.ReadError:
+                pass #Shard of an interrupted run: the indexed samples are complete
+
+
+def decode_sample(key, sample, metadata, decode=True, image_size=None):
+    image = sample["image.png"]
+    mask = sample["mask.png"]
+    if decode:
+        import numpy as np
+        import cv2 as cv
+        image = cv.imdecode(np.frombuffer(image, np.uint8), cv.IMREAD_COLOR)
+        mask = cv.imdecode(np.frombuffer(mask, np.uint8), cv.IMREAD_GRAYSCALE)
+        if image_size is not None:
+            image = cv.resize(image, (image_size, image_size))
+            mask = cv.resize(mask, (image_size, image_size))
+    return key, image, mask, metadata
@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import collections
+
+import numpy as np
+import cv2 as cv
+
+from segmentation.engine import BackgroundProducer, normalize, load_ground_truth
+from segmentation.metrics import confusion_matrix
+from segmentation.postprocess import prediction_to_mask
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+StreamResult = collections.namedtuple("StreamResult", ["frame_id", "mask", "counts", "latency"])
+
+
+def iter_directory(directory, watch=False, poll_interval=0.5, extensions=IMAGE_EXTENSIONS):
+    """
+    Yields (file_name, image) for the images of a directory in name order.
+    With watch=True it keeps polling the directory and yields new images as they appear (it never ends).
+    Only the names still present in the directory are remembered, so memory does not grow with the stream.
+    """
+    seen = set()
+    while True:
+        current = set(f for f in os.listdir(directory) if f.lower().endswith(extensions))
+        for file_name in sorted(current - seen):
+            image = cv.imread(os.path.join(directory, file_name), cv.IMREAD_COLOR)
+            if image is not None: #Files still being written are retried in the next poll
+                seen.add(file_name)
+                yield file_name, image
+        if not watch:
+            return
+        seen &= current
+        time.sleep(poll_interval)
+
+
+def iter_video(path, frame_step=1):
+    """
+    Yields (frame_index, frame) for every frame_step-th frame of a video file or camera index
+    """
+    capture = cv.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError("Could not open video: " + str(path))
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            if index % frame_step == 0:
+                yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_frames(frames):
+    """
+    Adapts any iterable of images, or of (frame_id, image) tuples, to (frame_id, image) tuples
+    """
+    for index, item in enumerate(frames):
+        if isinstance(item, tuple):
+            yield item
+        else:
+            yield index, item
+
+
+def _preprocess(frames, image_size, normalize_fn):
+    #Resized and normalized frames for the prefetch queue of stream_segment
+    for frame_id, frame in iter_frames(frames):
+        yield frame_id, frame.shape[:2], time.time(), normalize_fn(cv.resize(frame, (image_size, image_size)))
+
+
+def stream_segment(predict_fn, frames, image_size, batch_size=1, prefetch=8, max_wait=0.01, threshold=0.5,
+                   mask_fn=None, restore_size=False, normalize_fn=None):
+    """
+    Segments a stream of images, or of (frame_id, image) tuples (see iter_frames), and yields a StreamResult for every frame as soon as it is ready.
+    At most 'prefetch' preprocessed frames are kept in memory, so memory use does not depend on the stream length.
+    Frames are predicted in batches of up to batch_size, waiting at most max_wait seconds to fill a batch.
+    mask_fn(frame_id, image_size) optionally returns the binarized ground truth mask (or None), in which case
+    counts holds [TP, FP, FN, TN] for the frame. With restore_size=True masks are resized to the frame size.
+    normalize_fn is the normalization of the model (by default engine.normalize).
+    """
+    prefetcher = BackgroundProducer(lambda: _preprocess(frames, image_size, normalize_fn or normalize), prefetch)
+    try:
+        finished = False
+        while not finished:
+            items = []
+            item = prefetcher.get()
+            while item is not BackgroundProducer.end:
+                items.append(item)
+                if len(items) >= batch_size:
+                    break
+                try:
+                    item = prefetcher.get(timeout=max_wait)
+                except queue.Empty:
+                    break
+            else:
+                finished = True
+            if not items:
+                break
+
+            batch = np.stack([x for _, _, _, x in items])
+            masks = prediction_to_mask(predict_fn(batch), threshold)
+            for (frame_id, frame_shape, start_time, _), mask in zip(items, masks):
+                counts = None
+                if mask_fn is not None:
+                    gt = mask_fn(frame_id, image_size)
+                    if gt is not None:
+                        counts = confusion_matrix(mask, gt)
+                if restore_size and mask.shape != frame_shape:
+                    mask = cv.resize(mask, (frame_shape[1], frame_shape[0]), interpolation=cv.INTER_NEAREST)
+                yield StreamResult(frame_id, mask, counts, time.time() - start_time)
+    finally:
+        prefetcher.close()
+
+
+def directory_masks(masks_dir):
+    """
+    mask_fn for stream_segment that reads the ground truth with the same name as the frame, if it exists
+    """
+    def mask_fn(frame_id, image_size):
+        path = os.path.join(masks_dir, str(frame_id))
+        if not os.path.isfile(path):
+            return None
+        return load_ground_truth(path, image_size)
+    return mask_fn
@@ -0,0 +1,163 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from segmentation.engine import AsyncWriter, read_resized, load_ground_truth
+from segmentation.loading import load_predict_fn
+from segmentation.metrics import segmentation_metrics
+from segmentation.postprocess import prediction_to_mask
+
+
+class SharedArray:
+    """
+    Numpy array backed by a named shared memory block, so that worker processes can read it without copies.
+    The process that creates it must call unlink() when it is not needed anymore.
+    """
+    def __init__(self, shape, dtype, name=None):
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        if name is None:
+            nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+def preload_inputs(image_paths, mask_paths, image_sizes, num_workers=4, cache=None):
+    """
+    Decodes every image and ground truth mask once and resizes them to every model input size.
+    If an InputCache is given, the preprocessed inputs are read from it instead of decoded again.
+    Returns {image_size: (images SharedArray (N, S, S, 3) uint8, masks SharedArray (N, S, S) uint8)}
+    """
+    image_sizes = sorted(set(image_sizes))
+    read_image = cache.get_image if cache is not None else read_resized
+    read_mask = cache.get_mask if cache is not None else load_ground_truth
+    shared = {}
+    try:
+        for image_size in image_sizes:
+            shared[image_size] = (SharedArray((len(image_paths), image_size, image_size, 3), np.uint8),
+                                  SharedArray((len(image_paths), image_size, image_size), np.uint8))
+
+        def load(i):
+            for image_size in image_sizes:
+                images, masks = shared[image_size]
+                images.array[i] = read_image(image_paths[i], image_size)
+                masks.array[i] = read_mask(mask_paths[i], image_size)
+
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+            list(pool.map(load, range(len(image_paths))))
+    except BaseException:
+        release_inputs(shared)
+        raise
+    return shared
+
+
+def release_inputs(shared):
+    for images, masks in shared.values():
+        images.unlink()
+        masks.unlink()
+
+
+def _init_worker(intra_op_threads, inter_op_threads, use_gpu):
+    #TensorFlow threads and devices can only be configured before its runtime is initialized
+    os.environ["TF_CPP_MIN_LOG_LEVEL"]="2"
+    import tensorflow as tf
+    gpus = tf.config.list_physical_devices('GPU')
+    if not use_gpu:
+        tf.config.set_visible_devices([], 'GPU')
+    else:
+        #By default every process reserves almost all the GPU memory, and the other workers run out of memory
+        for gpu in gpus:
+            tf.config.experimental.set_memory_growth(gpu, True)
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def _evaluate_model(model_name, model_path, image_size, threshold, normalize_fn, images_spec, masks_spec, image_names,
+                    predictions_dir, batch_size, inference_mode, tflite_quantization):
+    images = SharedArray.attach(images_spec)
+    masks = SharedArray.attach(masks_spec)
+    try:
+        start_time = time.time()
+        #Same loading as the sequential path: the TFLite model is next to the model folder
+        predict_fn = load_predict_fn(os.path.dirname(model_path), os.path.basename(model_path), image_size, inference_mode,
+                                     tflite_quantization, warmup_batch_size=batch_size)
+        warmup_time = getattr(predict_fn, "warmup_time", None)
+        load_time = time.time() - start_time - (warmup_time or 0.0)
+
+        if not os.path.exists(predictions_dir):
+            os.makedirs(predictions_dir)
+        pred_masks = np.zeros((len(image_names), image_size, image_size), dtype=np.uint8)
+        start_time = time.time()
+        with AsyncWriter() as writer:
+            for start in range(0, len(image_names), batch_size):
+                end = min(start + batch_size, len(image_names))
+                pred_masks[start:end] = prediction_to_mask(predict_fn(normalize_fn(images.array[start:end])), threshold)
+                for j in range(start, end):
+                    writer.write(os.path.join(predictions_dir, image_names[j]), pred_masks[j])
+        predict_time = time.time() - start_time
+
+        model_metrics = segmentation_metrics(pred_masks, masks.array)
+    finally:
+        images.close()
+        masks.close()
+    timing = {'load': load_time, 'warmup': warmup_time, 'predict': predict_time}
+    return model_name, model_metrics, timing
+
+
+def run_sweep(models, image_paths, mask_paths, image_names, predictions_dir, batch_size=8, processes=None,
+              intra_op_threads=0, inter_op_threads=0, num_workers=4, cache=None, inference_mode="graph",
+              tflite_quantization="float16", use_gpu=True):
+    """
+    Evaluates several models in parallel, one model per worker process.
+    models: {model_name: (model_path, image_size, threshold, normalize_fn)}, with a picklable normalize_fn
+    (e.g. ModelRegistry.normalize_fn), so the metrics are the same as segmenting the models one after another.
+    The inputs are decoded once and shared with the workers through shared memory. The workers load the models with
+    inference_mode ("graph", "keras" or "tflite", see loading.load_predict_fn). With use_gpu, the workers share the
+    GPUs and allocate their memory as needed; otherwise the GPUs are hidden from them and they run on the CPU. Predictions are saved in predictions_dir/<model_name>/. Returns {model_name: metrics}.
+    """
+    shared = preload_inputs(image_paths, mask_paths, [model[1] for model in models.values()], num_workers, cache)
+    results = {}
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes or len(models), mp_context=context,
+                                 initializer=_init_worker, initargs=(intra_op_threads, inter_op_threads, use_gpu)) as pool:
+            futures = []
+            for model_name, (model_path, image_size, threshold, normalize_fn) in models.items():
+                images, masks = shared[image_size]
+                futures.append(pool.submit(_evaluate_model, model_name, model_path, image_size, threshold, normalize_fn,
+                                           images.spec, masks.spec, list(image_names),
+                                           os.path.join(predictions_dir, model_name), batch_size, inference_mode,
+                                           tflite_quantization))
+            for future in as_completed(futures):
+                model_name, model_metrics, timing = future.result()
+                print(str(model_name) + " - Load time: " + str(timing['load']) + "s, Warm-up time: " + str(timing['warmup'])
+                      + "s, Prediction time: " + str(timing['predict']) + "s")
+                results[model_name] = model_metrics
+    finally:
+        release_inputs(shared)
+    return {model_name: results[model_name] for model_name in models}
@@ -0,0 +1,100 @@
+import os
+import glob
+import time
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from segmentation.engine import load_image
+
+QUANTIZATIONS = ("float16", "int8", "dynamic")
+
+
+def tflite_path(path_models_dir, model_name, quantization):
+    return os.path.join(path_models_dir, model_name + "_" + quantization + ".tflite")
+
+
+def calibration_images(images_dir, pattern=os.path.join("*", "images", "*.png")):
+    """
+    Paths of the synthetic images used to calibrate the int8 quantization (all the categories of synthetic_images)
+    """
+    return sorted(glob.glob(os.path.join(images_dir, pattern)))
+
+
+def export_tflite(model_path, output_path, image_size, quantization="float16", calibration_paths=None, n_calibration=100):
+    """
+    Converts a SavedModel into a quantized TFLite model:
+    - float16: float16 weights.
+    - dynamic: int8 weights, float activations.
+    - int8: int8 weights and activations, calibrated on calibration_paths. Input and output stay float32.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError("Unknown quantization: " + str(quantization) + ". Options: " + ", ".join(QUANTIZATIONS))
+    converter = tf.lite.TFLiteConverter.from_saved_model(model_path)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs calibration images")
+        calibration_paths = list(calibration_paths)
+        step = max(1, len(calibration_paths) // n_calibration)
+        selected = calibration_paths[::step][:n_calibration]
+
+        def representative_dataset():
+            for path in selected:
+                yield [np.expand_dims(load_image(path, image_size), axis=0)]
+
+        converter.representative_dataset = representative_dataset
+    tflite_model = converter.convert()
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    return output_path
+
+
+class TFLiteModel:
+    """
+    Runs a TFLite model with the same interface as CompiledModel: called with a float32 batch (N, S, S, 3),
+    returns the predictions (N, S, S, 1). The interpreter is resized when the batch size changes.
+    The interpreter is not thread-safe, so concurrent calls (e.g. clients of the warm model process) run one at a time.
+    """
+    def __init__(self, path, image_size, num_threads=None, warmup_batch_size=1):
+        self.path = path
+        self.image_size = image_size
+        self.warmup_batch_size = warmup_batch_size
+        self.warmup_time = None
+        self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+        self._input_index = self.interpreter.get_input_details()[0]['index']
+        self._output_index = self.interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input_index, [batch_size, self.image_size, self.image_size, 3])
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def warmup(self):
+        start_time = time.time()
+        self(np.zeros((self.warmup_batch_size, self.image_size, self.image_size, 3), dtype=np.float32))
+        self.warmup_time = time.time() - start_time
+        return self.warmup_time
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            self._resize(x.shape[0])
+            self.interpreter.set_tensor(self._input_index, x)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output_index).copy()
+
+
+def load_tflite(path, image_size, num_threads=None, warmup_batch_size=1):
+    """
+    Returns the TFLite model in a warmed-up TFLiteModel
+    """
+    model = TFLiteModel(path, image_size, num_threads, warmup_batch_size)
+    model.warmup()
+    return model
@@ -0,0 +1,62 @@
+import numpy as np
+import cv2 as cv
+
+from segmentation.engine import normalize
+
+
+def tile_starts(length, tile_size, overlap):
+    """
+    Start positions of the tiles along one axis: tiles overlap at least 'overlap' pixels and the last one ends at the border
+    """
+    if length <= tile_size:
+        return [0]
+    stride = max(1, tile_size - overlap)
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def blend_window(tile_size, overlap):
+    """
+    2D blending weights of a tile: 1 in the center, linear ramp down to the borders over the overlap
+    """
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype=np.float32) + 1) / (overlap + 1)
+        ramp[:overlap] = np.minimum(ramp[:overlap], edge)
+        ramp[tile_size-overlap:] = np.minimum(ramp[tile_size-overlap:], edge[::-1])
+    return np.outer(ramp, ramp)
+
+
+def predict_tiled(predict_fn, image, tile_size=512, overlap=64, batch_size=8, normalize_fn=None):
+    """
+    Predicts an image of any size at its native resolution. The image is split into overlapping tile_size x tile_size
+    tiles, which are predicted in batches of batch_size, and the predictions are blended back with blend_window.
+    Images smaller than a tile are padded. The cost grows linearly with the image area.
+    image: uint8 BGR image (H, W, 3), normalized with normalize_fn (by default engine.normalize).
+    Returns the blended sigmoid output (H, W) as float32.
+    """
+    overlap = int(min(max(0, overlap), tile_size // 2))
+    height, width = image.shape[:2]
+    pad_y = max(0, tile_size - height)
+    pad_x = max(0, tile_size - width)
+    if pad_y or pad_x:
+        image = cv.copyMakeBorder(image, 0, pad_y, 0, pad_x, cv.BORDER_REFLECT_101)
+    x = (normalize_fn or normalize)(image)
+    full_height, full_width = x.shape[:2]
+
+    positions = [(y, x0) for y in tile_starts(full_height, tile_size, overlap) for x0 in tile_starts(full_width, tile_size, overlap)]
+    window = blend_window(tile_size, overlap)
+    accumulated = np.zeros((full_height, full_width), dtype=np.float32)
+    weights = np.zeros((full_height, full_width), dtype=np.float32)
+    for start in range(0, len(positions), batch_size):
+        batch_positions = positions[start:start+batch_size]
+        batch = np.stack([x[y:y+tile_size, x0:x0+tile_size] for y, x0 in batch_positions])
+        preds = np.asarray(predict_fn(batch), dtype=np.float32)
+        if preds.ndim == 4:
+            preds = preds[..., 0]
+        for (y, x0), pred in zip(batch_positions, preds):
+            accumulated[y:y+tile_size, x0:x0+tile_size] += pred * window
+            weights[y:y+tile_size, x0:x0+tile_size] += window
+    blended = accumulated / weights
+    return blended[:height, :width]
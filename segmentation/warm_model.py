@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from segmentation.engine import read_resized
+from segmentation.postprocess import prediction_to_mask
+
+DEFAULT_ADDRESS = ("localhost", 6061)
+#Random key created by every warm model process, readable only by the user that started it. The requests are pickled,
+#so a fixed key would let any local user run code in the warm model process
+AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".cables_segmentation", "warm_model.key")
+
+
+def create_authkey(path=AUTHKEY_FILE):
+    """
+    Creates a random key and saves it in path, in a folder and a file only accessible by the current user
+    """
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+        os.makedirs(folder, mode=0o700)
+    authkey = os.urandom(32)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def read_authkey(path=AUTHKEY_FILE):
+    """
+    Key of the running warm model process, or None if there is none
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _connect(address, authkey):
+    #None if no warm model process is running (or it was started by another user)
+    authkey = authkey if authkey is not None else read_authkey()
+    if authkey is None:
+        return None
+    try:
+        return Client(address, authkey=authkey)
+    except (ConnectionRefusedError, FileNotFoundError, OSError, AuthenticationError):
+        return None
+
+
+def segment_image(pool, model_name, image_path):
+    """
+    Segments one image with a model of the pool (registry.WarmPool), with its normalization and threshold.
+    Returns the mask and the time of every step
+    """
+    predict_fn, image_size, load_time = pool.get(model_name)
+    start_time = time.time()
+    x = pool.normalize(model_name, read_resized(image_path, image_size))[None]
+    preprocess_time = time.time() - start_time
+    start_time = time.time()
+    pred_mask = prediction_to_mask(predict_fn(x)[0], pool.threshold(model_name))
+    predict_time = time.time() - start_time
+    return {'mask': pred_mask, 'load_time': load_time, 'preprocess_time': preprocess_time, 'predict_time': predict_time}
+
+
+def serve(pool, address=DEFAULT_ADDRESS, authkey=None, preload=()):
+    """
+    Long-lived warm model process: listens on a local socket and answers segmentation requests
+    ({'model_name', 'image_path'}) with the models kept in memory. A {'command': 'shutdown'} request stops it and
+    {'command': 'stats'} returns the statistics of the pool (if it has them).
+    Only clients with the key are accepted: by default a new random key saved in AUTHKEY_FILE (removed on exit).
+    pool: registry.WarmPool (or any pool with its get(), normalize(), threshold() and stats() methods)
+    """
+    for model_name in preload:
+        pool.get(model_name)
+    stop = threading.Event()
+    key_file = authkey is None
+    if key_file:
+        authkey = create_authkey()
+    listener = Listener(address, authkey=authkey)
+    print("Warm model process listening on " + str(address[0]) + ":" + str(address[1]))
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if request.get('command') == 'shutdown':
+                    conn.send({'ok': True})
+                    stop.set()
+                    Client(address, authkey=authkey).close() #Unblocks accept()
+                    return
+                if request.get('command') == 'stats':
+                    conn.send({'ok': True, 'stats': pool.stats()})
+                    continue
+                try:
+                    response = segment_image(pool, request['model_name'], request['image_path'])
+                    response['ok'] = True
+                except Exception as e:
+                    response = {'ok': False, 'error': repr(e)}
+                conn.send(response)
+
+    try:
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError):
+                continue #Client without the key
+            if stop.is_set():
+                conn.close()
+                break
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+        if key_file and read_authkey() == authkey:
+            os.remove(AUTHKEY_FILE)
+
+
+def request_segmentation(model_name, image_path, address=DEFAULT_ADDRESS, authkey=None):
+    """
+    Sends a request to the warm model process (authkey: by default read from AUTHKEY_FILE). Returns its response,
+    or None if no warm process is running
+    """
+    conn = _connect(address, authkey)
+    if conn is None:
+        return None
+    with conn:
+        conn.send({'model_name': model_name, 'image_path': image_path})
+        response = conn.recv()
+    if not response['ok']:
+        raise RuntimeError("Warm model process error: " + response['error'])
+    return response
+
+
+def pool_stats(address=DEFAULT_ADDRESS, authkey=None):
+    """
+    Statistics of the models of the warm model process, or None if no warm process is running
+    """
+    conn = _connect(address, authkey)
+    if conn is None:
+        return None
+    with conn:
+        conn.send({'command': 'stats'})
+        return conn.recv()['stats']
+
+
+def shutdown(address=DEFAULT_ADDRESS, authkey=None):
+    conn = _connect(address, authkey)
+    if conn is None:
+        raise ConnectionRefusedError("No warm model process of this user is running")
+    with conn:
+        conn.send({'command': 'shutdown'})
+        return conn.recv()
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import cv2 as cv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.instances import extract_instances
+
+
+def polyline_ends(instances):
+    return sorted(tuple(int(v) for v in polyline[end]) for instance in instances for polyline in instance['polylines'] for end in (0, -1))
+
+
+def near(point, target, tolerance=6):
+    return abs(point[0] - target[0]) <= tolerance and abs(point[1] - target[1]) <= tolerance
+
+
+def test_crossing_lines_are_split_into_four_arms():
+    mask = np.zeros((200, 200), dtype=np.uint8)
+    cv.line(mask, (100, 10), (100, 190), 255, 7)
+    cv.line(mask, (10, 100), (190, 100), 255, 7)
+    instances = extract_instances(mask)
+    assert len(instances) == 1
+    assert len(instances[0]['polylines']) == 4
+    ends = polyline_ends(instances)
+    for tip in [(100, 10), (100, 190), (10, 100), (190, 100)]:
+        assert any(near(end, tip) for end in ends)
+
+
+def test_line_crossing_a_ring_keeps_the_whole_ring():
+    mask = np.zeros((200, 200), dtype=np.uint8)
+    cv.circle(mask, (100, 100), 50, 255, 7)
+    cv.line(mask, (10, 100), (190, 100), 255, 7)
+    instances = extract_instances(mask)
+    polylines = instances[0]['polylines']
+    #Two outer arms of the line, the segment inside the ring and the two halves of the ring
+    assert len(polylines) == 5
+    lengths = sorted(float(cv.arcLength(polyline.reshape(-1, 1, 2), False)) for polyline in polylines)
+    assert lengths[-1] > 130 and lengths[-2] > 130
+
+
+def test_closed_ring_is_one_polyline():
+    mask = np.zeros((200, 200), dtype=np.uint8)
+    cv.circle(mask, (100, 100), 50, 255, 7)
+    instances = extract_instances(mask)
+    assert len(instances[0]['polylines']) == 1
+    assert cv.arcLength(instances[0]['polylines'][0].reshape(-1, 1, 2), False) > 280
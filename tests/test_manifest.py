@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.manifest import PredictionManifest, model_fingerprint
+
+IMAGES = ["a.png", "b.png", "c.png"]
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def make_dataset(tmp_path):
+    dirs = {name: str(tmp_path / name) for name in ("images", "masks", "predictions", "model")}
+    for path in dirs.values():
+        os.makedirs(path)
+    for image_name in IMAGES:
+        write(os.path.join(dirs["images"], image_name), b"image " + image_name.encode())
+        write(os.path.join(dirs["masks"], image_name), b"mask " + image_name.encode())
+        write(os.path.join(dirs["predictions"], image_name), b"prediction")
+    write(os.path.join(dirs["model"], "saved_model.pb"), b"weights")
+    return dirs
+
+
+def predicted_manifest(dirs, fingerprint, threshold=0.5):
+    manifest = PredictionManifest(os.path.join(dirs["predictions"], "manifest.json"))
+    manifest.model_entry("unet", fingerprint, 512, threshold)
+    for image_name in IMAGES:
+        manifest.update("unet", image_name, [1, 2, 3, 4], dirs["images"], dirs["masks"])
+    manifest.save()
+    return PredictionManifest(manifest.path)
+
+
+def stale(manifest, dirs):
+    return manifest.stale_images("unet", IMAGES, dirs["images"], dirs["masks"], dirs["predictions"])
+
+
+def test_up_to_date_predictions_are_reused(tmp_path):
+    dirs = make_dataset(tmp_path)
+    fingerprint = model_fingerprint(dirs["model"], "graph", "unit")
+    manifest = predicted_manifest(dirs, fingerprint)
+    manifest.model_entry("unet", fingerprint, 512, 0.5)
+    assert stale(manifest, dirs) == []
+    assert manifest.counts("unet", IMAGES).tolist() == [[1, 2, 3, 4]] * 3
+
+
+def test_changed_inputs_and_missing_predictions_are_stale(tmp_path):
+    dirs = make_dataset(tmp_path)
+    fingerprint = model_fingerprint(dirs["model"], "graph", "unit")
+    manifest = predicted_manifest(dirs, fingerprint)
+    manifest.model_entry("unet", fingerprint, 512, 0.5)
+    write(os.path.join(dirs["images"], "a.png"), b"changed image")
+    write(os.path.join(dirs["masks"], "b.png"), b"changed mask")
+    os.remove(os.path.join(dirs["predictions"], "c.png"))
+    assert stale(manifest, dirs) == ["a.png", "b.png", "c.png"]
+
+
+def test_changed_settings_drop_the_model_entries(tmp_path):
+    dirs = make_dataset(tmp_path)
+    fingerprint = model_fingerprint(dirs["model"], "graph", "unit")
+    for settings in [(fingerprint, 512, 0.4), (model_fingerprint(dirs["model"], "graph", "other"), 512, 0.5),
+                     (model_fingerprint(dirs["model"], "tflite", "unit"), 512, 0.5)]:
+        manifest = predicted_manifest(dirs, fingerprint)
+        entry = manifest.model_entry("unet", *settings)
+        assert entry["images"] == {}
+        assert stale(manifest, dirs) == IMAGES
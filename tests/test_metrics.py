@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from segmentation.metrics import confusion_matrix, segmentation_metrics
+
+
+def compare_masks(mask1, mask2):
+    #Four-pass count of the original scripts, replaced by confusion_matrix
+    mask1 = np.array(mask1, dtype=np.uint8) > 0
+    mask2 = np.array(mask2, dtype=np.uint8) > 0
+    true_positives = np.count_nonzero(np.logical_and(mask1, mask2))
+    false_positives = np.count_nonzero(np.logical_and(mask1, np.logical_not(mask2)))
+    false_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), mask2))
+    true_negatives = np.count_nonzero(np.logical_and(np.logical_not(mask1), np.logical_not(mask2)))
+    return true_positives, false_positives, false_negatives, true_negatives
+
+
+def random_masks(shape, seed):
+    rng = np.random.RandomState(seed)
+    return (rng.rand(*shape) > 0.6).astype(np.uint8) * 255, (rng.rand(*shape) > 0.7).astype(np.uint8) * 255
+
+
+def test_single_mask_matches_compare_masks():
+    pred, gt = random_masks((64, 48), 0)
+    assert tuple(confusion_matrix(pred, gt)) == compare_masks(pred, gt)
+
+
+def test_stack_matches_compare_masks():
+    pred, gt = random_masks((5, 32, 40), 1)
+    counts = confusion_matrix(pred, gt)
+    assert counts.shape == (5, 4)
+    for i in range(5):
+        assert tuple(counts[i]) == compare_masks(pred[i], gt[i])
+    metrics = segmentation_metrics(pred, gt)
+    for i in range(5):
+        tp, fp, fn, _ = compare_masks(pred[i], gt[i])
+        assert np.isclose(metrics['IoU'][i], tp/(tp+fp+fn))
+        assert np.isclose(metrics['Dice'][i], (2*tp)/((2*tp)+fp+fn))
+
+
+def test_empty_masks():
+    pred = np.zeros((2, 16, 16), dtype=np.uint8)
+    pred[1, 3:5, 3:5] = 255
+    gt = np.zeros((2, 16, 16), dtype=np.uint8)
+    counts = confusion_matrix(pred, gt)
+    assert tuple(counts[0]) == compare_masks(pred[0], gt[0]) == (0, 0, 0, 256)
+    assert tuple(counts[1]) == compare_masks(pred[1], gt[1])
+    metrics = segmentation_metrics(pred, gt)
+    assert metrics['IoU'][0] == 1.0 and metrics['Dice'][0] == 1.0
+    assert metrics['IoU'][1] == 0.0 and metrics['Dice'][1] == 0.0